@@ -1,6 +1,7 @@
-import pandas as pd
 import matplotlib.pyplot as plt
-import numpy as np
+
+import WaterQualityFunction_nutrient as wqfn
+import WaterQualityFunction_determinand as wqfd
 
 def loc_subset(df, location, location_type="label"):
 
@@ -8,31 +9,26 @@ def loc_subset(df, location, location_type="label"):
 	Return a subsample of the main dataset, according to the location of interest
 
 	input:
-	df (DataFrame object)
+	df (DataFrame object, SamplingPointIndex or PartitionedStore): with a SamplingPointIndex the sampling points are looked up in the index instead of scanning the frame; with a PartitionedStore only the partitions of the location are read
 	location_label (str): the location of interest, e.g. "langstone" or "SO-G00"; empty string "" return entire catalogue
 	location_type (str): either "label" (e.g. "langstone", "portsmouth") or "notation" (e.g. "SO-G00", "SW-Z94")
 	
 	output:
-	df_subset (DataFrame object)
+	df_subset (DataFrame object): a copy, so the plot functions can assign their "Date" column into it
 
 	.. warning:: 
 	Performs **no** checks of the input.
 
 	"""
 	
-	if location_type == "label":
-    
-		locations = set(df['sample.samplingPoint.label'])
-		location_condition = [x for x in locations if location.lower() in x.lower()]
-		df_subset = df.loc[df['sample.samplingPoint.label'].isin(location_condition)].copy()
-
-	if location_type == "notation":
-    
-		locations_notations = set(df['sample.samplingPoint.notation'])
-		location_condition = [x for x in locations_notations if location.lower() in x.lower()]
-		df_subset = df.loc[df['sample.samplingPoint.notation'].isin(location_condition)].copy()	
-	
-	return df_subset
+	return wqfn.loc_subset(df, location, location_type).copy()
+
+
+def _definition(df, nutrient_determinand):
+	"""
+	Return the 'determinand.definition' of a determinand code in the dataset, for the y-axis label.
+	"""
+	return str(df['determinand.definition'].iloc[wqfd.determinand_rows(df, [nutrient_determinand])[0]])
 	
 
 		
@@ -55,37 +51,32 @@ def plot_location_nutrientVStime(df, location, nutrient_determinand, ax=None, se
 	"""
 	
 	if seasons is False:
-		df_env = loc_subset(df, location, location_type)
-		df_env.loc[:,"Date"] = pd.to_datetime(df_env['sample.sampleDateTime']).dt.date
+		time, nutrient = wqfn.nutrient_time(df, location, nutrient_determinand, location_type, date_format="date")
 
 		if ax is None:
 			ax = plt.gca()
 		
-		ax.plot(df_env[df_env['determinand.notation'] ==nutrient_determinand].sort_values(by="Date", ascending=True)['Date'],df_env[df_env['determinand.notation'] ==nutrient_determinand].sort_values(by="Date", ascending=True)['result'],color='teal', zorder=1,linewidth=2)
-		ax.scatter(df_env[df_env['determinand.notation'] ==nutrient_determinand].sort_values(by="Date", ascending=True)['Date'],df_env[df_env['determinand.notation'] ==nutrient_determinand].sort_values(by="Date", ascending=True)['result'],edgecolor="black", facecolor="white", linewidth=2, zorder=2, s=20)
+		ax.plot(time,nutrient,color='teal', zorder=1,linewidth=2)
+		ax.scatter(time,nutrient,edgecolor="black", facecolor="white", linewidth=2, zorder=2, s=20)
 		ax.set_xlabel("time")
-		ax.set_ylabel(str(df_env[df_env['determinand.notation'] ==nutrient_determinand].sort_values(by="Date",ascending=True)["determinand.definition"].iloc[0]))
+		ax.set_ylabel(_definition(df, nutrient_determinand))
 
 	if seasons is True:
-		df_env_summer = loc_subset(df.loc[(df["month"]>4)&(df["month"]<9)], location, location_type)
-		df_env_summer.loc[:,"Date"] = pd.to_datetime(df_env_summer['sample.sampleDateTime']).dt.date
-
-		df_env_winter = loc_subset(df.loc[np.logical_or(df["month"]<4,df["month"]>9)], location, location_type)
-		df_env_winter.loc[:,"Date"] =pd.to_datetime(df_env_winter['sample.sampleDateTime']).dt.date
+		time_summer, nutrient_summer, time_winter, nutrient_winter = wqfn.nutrient_time_seasons(df, location, nutrient_determinand, location_type, date_format="date")
 
 		if ax is None:
 			ax = plt.gca()  
-		ax.plot(df_env_summer[df_env_summer['determinand.notation'] ==nutrient_determinand].sort_values(by="Date", ascending=True)['Date'],df_env_summer[df_env_summer['determinand.notation'] ==nutrient_determinand].sort_values(by="Date", ascending=True)['result'],zorder=1, linewidth = 2, color='#EE6A50', linestyle=':')
+		ax.plot(time_summer,nutrient_summer,zorder=1, linewidth = 2, color='#EE6A50', linestyle=':')
 		
-		ax.scatter(df_env_summer[df_env_summer['determinand.notation'] ==nutrient_determinand].sort_values(by="Date", ascending=True)['Date'],df_env_summer[df_env_summer['determinand.notation'] ==nutrient_determinand].sort_values(by="Date", ascending=True)['result'],zorder=2, label="summer", color='orange', marker="+", s=30)
+		ax.scatter(time_summer,nutrient_summer,zorder=2, label="summer", color='orange', marker="+", s=30)
 
-		ax.plot(df_env_winter[df_env_winter['determinand.notation'] ==nutrient_determinand].sort_values(by="Date", ascending=True)['Date'],df_env_winter[df_env_winter['determinand.notation'] ==nutrient_determinand].sort_values(by="Date", ascending=True)['result'],zorder=1, linewidth = 2, color='teal', linestyle='--')
+		ax.plot(time_winter,nutrient_winter,zorder=1, linewidth = 2, color='teal', linestyle='--')
 		
-		ax.scatter(df_env_winter[df_env_winter['determinand.notation'] ==nutrient_determinand].sort_values(by="Date", ascending=True)['Date'],df_env_winter[df_env_winter['determinand.notation'] ==nutrient_determinand].sort_values(by="Date", ascending=True)['result'],zorder=2, label="winter", color='blue', marker='o', s=20)
+		ax.scatter(time_winter,nutrient_winter,zorder=2, label="winter", color='blue', marker='o', s=20)
 		
 		ax.legend(fontsize=18)
 		ax.set_xlabel("time")
-		ax.set_ylabel(str(df_env_winter[df_env_winter['determinand.notation'] ==nutrient_determinand].sort_values(by="Date",ascending=True)["determinand.definition"].iloc[0]))
+		ax.set_ylabel(_definition(df, nutrient_determinand))
 	return(ax)
 
 def plot_location_nutrientVStime_customizable(df, location, nutrient_determinand, ax=None,seasons=False, location_type="label", plt_kwargs={}, sct_kwargs={},plt_kwargs_s={}, sct_kwargs_s={}, plt_kwargs_w={}, sct_kwargs_w={}, ylabel=None, plot_title=None):
@@ -114,31 +105,26 @@ def plot_location_nutrientVStime_customizable(df, location, nutrient_determinand
 	
 	
 	if seasons is False:
-		df_env = loc_subset(df, location, location_type)
-		df_env.loc[:,"Date"] = pd.to_datetime(df_env['sample.sampleDateTime']).dt.date
+		time, nutrient = wqfn.nutrient_time(df, location, nutrient_determinand, location_type, date_format="date")
 
 		if ax is None:
 			ax = plt.gca()
-		ax.plot(df_env[df_env['determinand.notation'] ==nutrient_determinand].sort_values(by="Date", ascending=True)['Date'],df_env[df_env['determinand.notation'] ==nutrient_determinand].sort_values(by="Date", ascending=True)['result'], zorder=1, **plt_kwargs)
-		ax.scatter(df_env[df_env['determinand.notation'] ==nutrient_determinand].sort_values(by="Date", ascending=True)['Date'],df_env[df_env['determinand.notation'] ==nutrient_determinand].sort_values(by="Date", ascending=True)['result'], **sct_kwargs, zorder=2)
+		ax.plot(time,nutrient, zorder=1, **plt_kwargs)
+		ax.scatter(time,nutrient, **sct_kwargs, zorder=2)
 		ax.set_xlabel("time")
 		
 		if ylabel != None:
 			ax.set_ylabel(str(ylabel))
 
 	if seasons is True:
-		df_env_summer = loc_subset(df.loc[(df["month"]>4)&(df["month"]<9)], location, location_type)
-		df_env_summer.loc[:,"Date"] = pd.to_datetime(df_env_summer['sample.sampleDateTime']).dt.date
-
-		df_env_winter =loc_subset(df.loc[np.logical_or(df["month"]<4,df["month"]>9)], location, location_type)
-		df_env_winter.loc[:,"Date"] =pd.to_datetime(df_env_winter['sample.sampleDateTime']).dt.date
+		time_summer, nutrient_summer, time_winter, nutrient_winter = wqfn.nutrient_time_seasons(df, location, nutrient_determinand, location_type, date_format="date")
 
 		if ax is None:
 			ax = plt.gca()  
-		ax.plot(df_env_summer[df_env_summer['determinand.notation'] ==nutrient_determinand].sort_values(by="Date", ascending=True)['Date'],df_env_summer[df_env_summer['determinand.notation'] ==nutrient_determinand].sort_values(by="Date", ascending=True)['result'],zorder=1,**plt_kwargs_s)
-		ax.scatter(df_env_summer[df_env_summer['determinand.notation'] ==nutrient_determinand].sort_values(by="Date", ascending=True)['Date'],df_env_summer[df_env_summer['determinand.notation'] ==nutrient_determinand].sort_values(by="Date", ascending=True)['result'],zorder=2, label="summer", **sct_kwargs_s)
-		ax.plot(df_env_winter[df_env_winter['determinand.notation'] ==nutrient_determinand].sort_values(by="Date", ascending=True)['Date'],df_env_winter[df_env_winter['determinand.notation'] ==nutrient_determinand].sort_values(by="Date", ascending=True)['result'],zorder=1, **plt_kwargs_w)
-		ax.scatter(df_env_winter[df_env_winter['determinand.notation'] ==nutrient_determinand].sort_values(by="Date", ascending=True)['Date'],df_env_winter[df_env_winter['determinand.notation'] ==nutrient_determinand].sort_values(by="Date", ascending=True)['result'],zorder=2, label="winter",**sct_kwargs_w)
+		ax.plot(time_summer,nutrient_summer,zorder=1,**plt_kwargs_s)
+		ax.scatter(time_summer,nutrient_summer,zorder=2, label="summer", **sct_kwargs_s)
+		ax.plot(time_winter,nutrient_winter,zorder=1, **plt_kwargs_w)
+		ax.scatter(time_winter,nutrient_winter,zorder=2, label="winter",**sct_kwargs_w)
 		ax.legend(fontsize=18)
 		ax.set_xlabel("time")
 		if ylabel != None:
@@ -169,14 +155,13 @@ def plot_location_nutrientVStime_customizable_summer(df, location, nutrient_dete
 	ax (Axes object)
 	"""
 
-	df_env_summer = loc_subset(df.loc[(df["month"]>4)&(df["month"]<9)], location, location_type)
-	df_env_summer.loc[:,"Date"] = pd.to_datetime(df_env_summer['sample.sampleDateTime']).dt.date
+	time_summer, nutrient_summer = wqfn.nutrient_time_seasons(df, location, nutrient_determinand, location_type, date_format="date")[:2]
 
 
 	if ax is None:
 		ax = plt.gca()  
-	ax.plot(df_env_summer[df_env_summer['determinand.notation'] ==nutrient_determinand].sort_values(by="Date", ascending=True)['Date'],df_env_summer[df_env_summer['determinand.notation'] ==nutrient_determinand].sort_values(by="Date", ascending=True)['result'],zorder=1,**plt_kwargs_s)
-	ax.scatter(df_env_summer[df_env_summer['determinand.notation'] ==nutrient_determinand].sort_values(by="Date", ascending=True)['Date'],df_env_summer[df_env_summer['determinand.notation'] ==nutrient_determinand].sort_values(by="Date", ascending=True)['result'],zorder=2, **sct_kwargs_s,  label=label_str)
+	ax.plot(time_summer,nutrient_summer,zorder=1,**plt_kwargs_s)
+	ax.scatter(time_summer,nutrient_summer,zorder=2, **sct_kwargs_s,  label=label_str)
 
 
 	if ylabel != None:
@@ -213,13 +198,12 @@ def plot_location_nutrientVStime_customizable_winter(df, location, nutrient_dete
 	ax (Axes object)
 	"""
 
-	df_env_winter =loc_subset(df.loc[np.logical_or(df["month"]<4,df["month"]>9)], location, location_type)
-	df_env_winter.loc[:,"Date"] =pd.to_datetime(df_env_winter['sample.sampleDateTime']).dt.date
+	time_winter, nutrient_winter = wqfn.nutrient_time_seasons(df, location, nutrient_determinand, location_type, date_format="date")[2:]
 
 	if ax is None:
 		ax = plt.gca()  
-	ax.plot(df_env_winter[df_env_winter['determinand.notation'] ==nutrient_determinand].sort_values(by="Date", ascending=True)['Date'],df_env_winter[df_env_winter['determinand.notation'] ==nutrient_determinand].sort_values(by="Date", ascending=True)['result'],zorder=1, **plt_kwargs_w)
-	ax.scatter(df_env_winter[df_env_winter['determinand.notation'] ==nutrient_determinand].sort_values(by="Date", ascending=True)['Date'],df_env_winter[df_env_winter['determinand.notation'] ==nutrient_determinand].sort_values(by="Date", ascending=True)['result'],zorder=2, **sct_kwargs_w, label=label_str)
+	ax.plot(time_winter,nutrient_winter,zorder=1, **plt_kwargs_w)
+	ax.scatter(time_winter,nutrient_winter,zorder=2, **sct_kwargs_w, label=label_str)
 
 
 	if ylabel != None:
@@ -239,16 +223,7 @@ def plot_location_nutrientVStime_customizable_winter(df, location, nutrient_dete
 
 def DAIN(df, location, ax=None, seasons=False, location_type="label", plt_kwargs={}, sct_kwargs={},plt_kwargs_s={}, sct_kwargs_s={}, plt_kwargs_w={}, sct_kwargs_w={}, xlabel=None, ylabel=None, plot_title=None, label_str=None):
 	if seasons is False:
-		df_env = loc_subset(df,  location, location_type)
-		df_env.loc[:,"Date"] = pd.to_datetime(df_env['sample.sampleDateTime']).dt.date
-	
-		dain_ = []
-		date_ = []
-		for date in np.unique(df_env["Date"].iloc[0::]):
-			if (df_env[(df_env["Date"] == date)&(df_env['determinand.notation'] == 111) ]["Date"].size>0) &(df_env[(df_env["Date"] == date)&(df_env['determinand.notation'] == 116) ]["Date"].size>0):
-
-				dain_.append(df_env[(df_env["Date"] == date)&(df_env['determinand.notation'] == 111) ]["result"].values[0]+df_env[(df_env["Date"] == date)&(df_env['determinand.notation'] == 116) ]["result"].values[0])
-				date_.append(date)
+		dain_, date_ = wqfn.DAIN_time(df, location, location_type, date_format="date", paired=True)
 
 		if ax is None:
 			ax = plt.gca()
@@ -263,35 +238,14 @@ def DAIN(df, location, ax=None, seasons=False, location_type="label", plt_kwargs
 			ax.set_title(label=str(plot_title), fontsize=18)
 		
 	if seasons is True:
-		df_env_summer = loc_subset(df.loc[(df["month"]>4)&(df["month"]<9)], location, location_type)
-		df_env_summer.loc[:,"Date"] = pd.to_datetime(df_env_summer['sample.sampleDateTime']).dt.date
-
-		df_env_winter =loc_subset(df.loc[np.logical_or(df["month"]<4,df["month"]>9)], location, location_type)
-		df_env_winter.loc[:,"Date"] =pd.to_datetime(df_env_winter['sample.sampleDateTime']).dt.date
-		
-		dain_summer = []
-		date_summer = []
-		for date in np.unique(df_env_summer["Date"].iloc[0::]):
-			if (df_env_summer[(df_env_summer["Date"] == date)&(df_env_summer['determinand.notation'] == 111) ]["Date"].size>0) &(df_env_summer[(df_env_summer["Date"] == date)&(df_env_summer['determinand.notation'] == 116) ]["Date"].size>0):
-
-				dain_summer.append(df_env_summer[(df_env_summer["Date"] == date)&(df_env_summer['determinand.notation'] == 111) ]["result"].values[0]+df_env_summer[(df_env_summer["Date"] == date)&(df_env_summer['determinand.notation'] == 116) ]["result"].values[0])
-				date_summer.append(date)
-
-		dain_winter = []
-		date_winter = []
-		for date in np.unique(df_env_winter["Date"].iloc[0::]):
-			if (df_env_winter[(df_env_winter["Date"] == date)&(df_env_winter['determinand.notation'] == 111) ]["Date"].size>0) &(df_env_winter[(df_env_winter["Date"] == date)&(df_env_winter['determinand.notation'] == 116) ]["Date"].size>0):
-
-
-				dain_winter.append(df_env_winter[(df_env_winter["Date"] == date)&(df_env_winter['determinand.notation'] == 111) ]["result"].values[0]+df_env_winter[(df_env_winter["Date"] == date)&(df_env_winter['determinand.notation'] == 116) ]["result"].values[0])
-				date_winter.append(date)
+		date_summer, dain_summer, date_winter, dain_winter = wqfn.DAIN_time_seasons(df, location, location_type, date_format="date", paired=True)
 		
 		if ax is None:
 			ax = plt.gca()		
 		ax.scatter(date_summer, dain_summer, zorder=2, **sct_kwargs_s, label="summer")
-		ax.plot(date_winter, dain_winter, zorder=1, **plt_kwargs_s)
-		ax.scatter(df_env_winter[df_env_winter['determinand.notation'] == 111].sort_values(by="Date", ascending=True)['Date'], dain_winter, zorder=2, **sct_kwargs_w, label="winter")
-		ax.plot(df_env_winter[df_env_winter['determinand.notation'] == 111].sort_values(by="Date", ascending=True)['Date'], dain_winter, zorder=1, **plt_kwargs_w)
+		ax.plot(date_summer, dain_summer, zorder=1, **plt_kwargs_s)
+		ax.scatter(date_winter, dain_winter, zorder=2, **sct_kwargs_w, label="winter")
+		ax.plot(date_winter, dain_winter, zorder=1, **plt_kwargs_w)
 
 
 		if ylabel != None:
@@ -309,17 +263,7 @@ def DAIN(df, location, ax=None, seasons=False, location_type="label", plt_kwargs
 	
 def DAIN_summer(df, location, ax=None, location_type="label", plt_kwargs={}, sct_kwargs={},plt_kwargs_s={}, sct_kwargs_s={}, xlabel=None, ylabel=None, plot_title=None, label_str=None):
 
-	df_env_summer = loc_subset(df.loc[(df["month"]>4)&(df["month"]<9)], location, location_type)
-	df_env_summer.loc[:,"Date"] = pd.to_datetime(df_env_summer['sample.sampleDateTime']).dt.date
-	
-	dain_summer = []
-	date_ = []
-	for date in np.unique(df_env_summer["Date"].iloc[0::]):
-		if (df_env_summer[(df_env_summer["Date"] == date)&(df_env_summer['determinand.notation'] == 111) ]["Date"].size>0) &(df_env_summer[(df_env_summer["Date"] == date)&(df_env_summer['determinand.notation'] == 116) ]["Date"].size>0):
-
-			dain_summer.append(df_env_summer[(df_env_summer["Date"] == date)&(df_env_summer['determinand.notation'] == 111) ]["result"].values[0]+df_env_summer[(df_env_summer["Date"] == date)&(df_env_summer['determinand.notation'] == 116) ]["result"].values[0])
-
-			date_.append(date)
+	date_, dain_summer = wqfn.DAIN_time_seasons(df, location, location_type, date_format="date", paired=True)[:2]
 
 
 	if ax is None:
@@ -342,16 +286,7 @@ def DAIN_summer(df, location, ax=None, location_type="label", plt_kwargs={}, sct
 	
 def DAIN_winter(df, location, ax=None, location_type="label", plt_kwargs={}, sct_kwargs={}, plt_kwargs_w={}, sct_kwargs_w={}, xlabel=None, ylabel=None, plot_title=None, label_str=None):
 
-	df_env_winter = loc_subset(df.loc[np.logical_or(df["month"]<4,df["month"]>9)], location, location_type)
-	df_env_winter.loc[:,"Date"] =pd.to_datetime(df_env_winter['sample.sampleDateTime']).dt.date
-
-	dain_winter = []
-	date_ = []
-	for date in np.unique(df_env_winter["Date"].iloc[0::]):
-		if (df_env_winter[(df_env_winter["Date"] == date)&(df_env_winter['determinand.notation'] == 111) ]["Date"].size>0) &(df_env_winter[(df_env_winter["Date"] == date)&(df_env_winter['determinand.notation'] == 116) ]["Date"].size>0):
-
-			dain_winter.append(df_env_winter[(df_env_winter["Date"] == date)&(df_env_winter['determinand.notation'] == 111) ]["result"].values[0]+df_env_winter[(df_env_winter["Date"] == date)&(df_env_winter['determinand.notation'] == 116) ]["result"].values[0])
-			date_.append(date)	
+	date_, dain_winter = wqfn.DAIN_time_seasons(df, location, location_type, date_format="date", paired=True)[2:]
 		
 
 	
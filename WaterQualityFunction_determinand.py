@@ -0,0 +1,124 @@
+import numpy as np
+import weakref
+
+
+DETERMINANDS = {
+	111: ("Ammoniacal Nitrogen as N", "mg/l"),
+	114: ("Nitrogen, Kjeldahl as N", "mg/l"),
+	116: ("Nitrogen, Total Oxidised as N", "mg/l"),
+	117: ("Nitrate as N", "mg/l"),
+	118: ("Nitrite as N", "mg/l"),
+	119: ("Ammonia un-ionised as N", "mg/l"),
+	180: ("Orthophosphate, reactive as P", "mg/l"),
+	947: ("Chlorophyll : Acetone Extract", "ug/l"),
+	4925: ("Nitrogen, Dissolved Inorganic : as N", "mg/l"),
+	6485: ("Nitrite, Filtered as N", "mg/l"),
+	9686: ("Nitrogen, Total as N", "mg/l"),
+	9853: ("Nitrate, Filtered as N", "mg/l"),
+	9943: ("Nitrogen, Total Oxidised, Filtered as N", "mg/l"),
+	9993: ("Ammoniacal Nitrogen, Filtered as N", "mg/l"),
+	76: ("Temperature of Water", "cel"),
+	162: ("Salinity : In Situ", "ppt"),
+}
+
+FAMILIES = {
+	"ammonia": (111, 9993, 119),
+	"oxidised_N": (116, 9943, 117, 9853, 118, 6485),
+	"DAIN": (116, 9943, 111, 119),
+	"DAIN_paired": (111, 116),
+	"nitrogen": (119, 111, 9993, 117, 9853, 118, 6485, 4925, 114, 116, 9943, 9686),
+	"chlorophyll": (947,),
+}
+
+
+def codes(determinands):
+	"""
+	Return the determinand codes of a family name (e.g. "ammonia", see FAMILIES) as a list; codes are returned unchanged.
+	"""
+	if isinstance(determinands, str):
+		return list(FAMILIES[determinands])
+	return determinands
+
+
+def definition(code):
+	"""
+	Return the (definition, unit) of a determinand code, e.g. ("Nitrite as N", "mg/l") for 118.
+	"""
+	return DETERMINANDS[int(code)]
+
+
+_determinand_indices = {}
+
+
+class DeterminandIndex:
+	"""
+	Row positions of each determinand of a frame, from a single stable argsort of 'determinand.notation':
+	the rows of a determinand or a family are a lookup, instead of a comparison of the whole column per query.
+	"""
+
+	def __init__(self, df):
+		determinands = df['determinand.notation'].to_numpy()
+		self.order = np.argsort(determinands, kind="stable")
+		self.codes, self.starts = np.unique(determinands[self.order], return_index=True)
+		self.stops = np.append(self.starts[1:], len(self.order))
+		self.n_rows = len(determinands)
+		self._rows = {}
+
+	def rows(self, determinands):
+		"""
+		Return the sorted row positions of one or more determinands, or of a family name.
+		"""
+		key = tuple(sorted(set(int(code) for code in np.atleast_1d(codes(determinands)))))
+		if key not in self._rows:
+			found = np.flatnonzero(np.isin(self.codes, key))
+			self._rows[key] = np.sort(np.concatenate([self.order[self.starts[i]:self.stops[i]] for i in found] + [np.empty(0, dtype=np.intp)]))
+		return self._rows[key]
+
+	def mask(self, determinands):
+		"""
+		Return the boolean mask of the rows of one or more determinands, or of a family name.
+		"""
+		mask = np.zeros(self.n_rows, dtype=bool)
+		mask[self.rows(determinands)] = True
+		return mask
+
+
+def index_determinands(df):
+	"""
+	Build the DeterminandIndex of a frame and attach it to the frame, so that batch_time and determinand_rows use it.
+
+	input:
+	df (DataFrame object)
+
+	output:
+	index (DeterminandIndex object)
+
+	.. warning::
+	The index belongs to the given object: rebuild it after adding or removing rows.
+	"""
+	index = DeterminandIndex(df)
+	key = id(df)
+	_determinand_indices[key] = index
+	weakref.finalize(df, _determinand_indices.pop, key, None)
+	return index
+
+
+def determinand_index(df):
+	"""
+	Return the DeterminandIndex attached to a frame by index_determinands, None for any other frame.
+	"""
+	index = _determinand_indices.get(id(df))
+	if index is None or index.n_rows != len(df):
+		return None
+	return index
+
+
+def determinand_rows(df, determinands):
+	"""
+	Return the sorted row positions of one or more determinands, or of a family name: a lookup in the attached index if any,
+	otherwise a single isin over the column.
+	"""
+	index = determinand_index(df)
+	if index is not None:
+		return index.rows(determinands)
+	return np.flatnonzero(df['determinand.notation'].isin(np.atleast_1d(codes(determinands))).to_numpy())
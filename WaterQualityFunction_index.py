@@ -0,0 +1,202 @@
+import pandas as pd
+import numpy as np
+import re
+import weakref
+
+
+LOCATION_COLUMNS = {"label": 'sample.samplingPoint.label', "notation": 'sample.samplingPoint.notation'}
+
+
+def place_pattern(place):
+	"""
+	Return the compiled regex matching any of the places as a substring, e.g. "langstone|portsmouth"; "" matches everything.
+	"""
+	return re.compile("|".join(re.escape(str(place_).lower()) for place_ in np.atleast_1d(place)))
+
+
+def match_places(tokens, place):
+	"""
+	Return the mask of the lowercase tokens (unique labels/notations) that contain any of the places, in a single pass.
+	"""
+	return tokens.str.contains(place_pattern(place), na=False).to_numpy(dtype=bool)
+
+
+def _concatenate_ranges(starts, stops):
+	"""
+	Return the row positions covered by the half-open ranges [starts, stops), concatenated, without a Python loop.
+	"""
+	lengths = stops - starts
+	total = lengths.sum()
+	if total == 0:
+		return np.empty(0, dtype=np.intp)
+	offsets = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+	return np.arange(total, dtype=np.intp) + offsets
+
+
+def _block_tokens(uniques, codes):
+	"""
+	Return the lowercase label/notation of each block, NaN where the frame has no value.
+	"""
+	values = pd.Categorical.from_codes(codes, categories=np.asarray(uniques, dtype=object))
+	return pd.Series(values).astype(object).str.lower()
+
+
+class SamplingPointIndex:
+	"""
+	Index of the main dataset by sampling point, to be built once and queried many times.
+	The frame is sorted by (notation, label), so that each sampling point is a contiguous block of rows;
+	a query matches the lowercase tokens against the unique notations/labels only and returns the blocks with a single take.
+
+	input:
+	df (DataFrame object)
+
+	Example:
+	index = SamplingPointIndex(df)
+	df_report_freshwater = wqfn.loc_subset(index, ["G0003616", "G0003625"], "notation")
+	"""
+
+	def __init__(self, df):
+		notation_codes, notations = pd.factorize(df[LOCATION_COLUMNS["notation"]], sort=True)
+		label_codes, labels = pd.factorize(df[LOCATION_COLUMNS["label"]], sort=True)
+
+		order = np.lexsort((label_codes, notation_codes))
+		notation_codes = notation_codes[order]
+		label_codes = label_codes[order]
+		self.df = df.take(order)
+
+		change = np.ones(len(order), dtype=bool)
+		change[1:] = (notation_codes[1:] != notation_codes[:-1]) | (label_codes[1:] != label_codes[:-1])
+		self.starts = np.flatnonzero(change)
+		self.stops = np.append(self.starts[1:], len(order))
+
+		self.tokens = {
+			"notation": _block_tokens(notations, notation_codes[self.starts]),
+			"label": _block_tokens(labels, label_codes[self.starts]),
+		}
+
+	def __len__(self):
+		return len(self.df)
+
+	def blocks(self, place, location_type="label"):
+		"""
+		Return the positions of the sampling-point blocks whose label/notation contains any of the places.
+
+		input:
+		place (str or list of str): the location(s) of interest, e.g. "langstone" or ["G0003616", "G0003625"]; empty string "" matches every block
+		location_type (str): either "label" or "notation"
+
+		output:
+		blocks (ndarray of int)
+		"""
+		return np.flatnonzero(match_places(self.tokens[location_type], place))
+
+	def ranges(self, place, location_type="label"):
+		"""
+		Return the row ranges [start, stop) of the sorted frame that belong to the requested places.
+
+		output:
+		starts, stops (ndarray of int)
+		"""
+		blocks = self.blocks(place, location_type)
+		return self.starts[blocks], self.stops[blocks]
+
+	def positions(self, place, location_type="label"):
+		"""
+		Return the row positions of the sorted frame that belong to the requested places.
+		"""
+		return _concatenate_ranges(*self.ranges(place, location_type))
+
+	def subset(self, place, location_type="label"):
+		"""
+		Return a subsample of the main dataset, according to the location(s) of interest.
+		Same as loc_subset, but rows are ordered by sampling point and a row matching several places is returned once.
+
+		output:
+		df_subset (DataFrame object)
+		"""
+		return self.df.take(self.positions(place, location_type))
+
+
+_time_blocks = {}
+
+
+class TimeBlocks:
+	"""
+	Contiguous (sampling point, determinand) blocks of a frame sorted by sort_by_time.
+	Rows of a block are in time order, so a time series is a slice of the frame: no sort and no boolean mask per query.
+	"""
+
+	def __init__(self, df, notation_codes, notations, determinands, sample_time):
+		change = np.ones(len(df), dtype=bool)
+		change[1:] = (notation_codes[1:] != notation_codes[:-1]) | (determinands[1:] != determinands[:-1])
+		self.starts = np.flatnonzero(change)
+		self.stops = np.append(self.starts[1:], len(df))
+		self.time = sample_time
+		self.block_notation = pd.Categorical.from_codes(notation_codes[self.starts], categories=np.asarray(notations, dtype=object))
+		self.block_determinand = determinands[self.starts]
+
+		site_labels = df[list(LOCATION_COLUMNS.values())].drop_duplicates()
+		self.tokens = {
+			"notation": pd.Series(np.asarray(notations, dtype=object)).str.lower(),
+			"label": site_labels[LOCATION_COLUMNS["label"]].astype(object).str.lower(),
+		}
+		self.token_notations = {
+			"notation": np.asarray(notations, dtype=object),
+			"label": site_labels[LOCATION_COLUMNS["notation"]].to_numpy(dtype=object),
+		}
+
+	def notations(self, place, location_type="label"):
+		"""
+		Return the sampling point notations whose label/notation contains any of the places.
+		"""
+		match = match_places(self.tokens[location_type], place)
+		return pd.unique(self.token_notations[location_type][match])
+
+	def positions(self, place, determinand, location_type="label"):
+		"""
+		Return the row positions of one determinand at the requested places, in time order.
+		With a single sampling point this is a single range; blocks of several sampling points are merged by time.
+		"""
+		blocks = np.flatnonzero(np.isin(self.block_notation, self.notations(place, location_type)) & (self.block_determinand == determinand))
+		if len(blocks) == 1:
+			return np.arange(self.starts[blocks[0]], self.stops[blocks[0]])
+		positions = _concatenate_ranges(self.starts[blocks], self.stops[blocks])
+		return positions[np.argsort(self.time[positions], kind="stable")]
+
+
+def sort_by_time(df):
+	"""
+	Return the frame sorted once by (sampling point notation, determinand, sample time) and flagged as such:
+	nutrient_time then extracts each series as a contiguous slice, instead of filtering and sorting on every call.
+
+	input:
+	df (DataFrame object)
+
+	output:
+	df_sorted (DataFrame object)
+
+	.. warning::
+	The flag belongs to the returned object: frames derived from it (subsets, copies) are not flagged.
+	"""
+	notation_codes, notations = pd.factorize(df[LOCATION_COLUMNS["notation"]], sort=True)
+	determinands = df['determinand.notation'].to_numpy()
+	sample_time = pd.to_datetime(df['sample.sampleDateTime']).to_numpy().astype("datetime64[ns]").view(np.int64)
+
+	order = np.lexsort((sample_time, determinands, notation_codes))
+	df_sorted = df.take(order)
+	blocks = TimeBlocks(df_sorted, notation_codes[order], notations, determinands[order], sample_time[order])
+
+	key = id(df_sorted)
+	_time_blocks[key] = blocks
+	weakref.finalize(df_sorted, _time_blocks.pop, key, None)
+	return df_sorted
+
+
+def time_blocks(df):
+	"""
+	Return the TimeBlocks of a frame returned by sort_by_time, None for any other frame.
+	"""
+	blocks = _time_blocks.get(id(df))
+	if blocks is None or len(blocks.time) != len(df):
+		return None
+	return blocks
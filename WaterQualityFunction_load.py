@@ -0,0 +1,206 @@
+import os
+
+import pandas as pd
+import numpy as np
+
+
+SCHEMA = {
+	'sample.samplingPoint.notation': 'category',
+	'sample.samplingPoint.label': 'category',
+	'determinand.definition': 'category',
+	'determinand.notation': 'int16',
+	'resultQualifier.notation': 'category',
+	'result': 'float32',
+}
+
+DATE_COLUMNS = ['sample.sampleDateTime']
+
+DAY_COLUMN = "Date"
+
+QUALIFIER_COLUMN = "qualifier"
+
+QUALIFIERS = {"<": 1, ">": 2}
+
+CACHE_FORMATS = {".feather": "feather", ".parquet": "parquet"}
+
+
+def _cache_path(path, cache_format="feather"):
+	root, _ = os.path.splitext(path)
+	return root + "." + cache_format
+
+
+def qualifier_codes(qualifier):
+	"""
+	Return the int8 code of each result qualifier: 0 for a reported value, 1 for "<" (below the limit of detection, the result
+	being the limit) and 2 for ">" (above the limit of quantification), see QUALIFIERS. Only the unique qualifiers are looked up.
+
+	input:
+	qualifier (Series object): e.g. df['resultQualifier.notation']
+
+	output:
+	codes (ndarray of int8)
+	"""
+	codes, uniques = pd.factorize(qualifier)
+	lookup = np.array([QUALIFIERS.get(str(unique).strip(), 0) for unique in uniques] + [0], dtype=np.int8)
+	return lookup[codes]
+
+
+def _apply_schema(df):
+	"""
+	Cast the columns of the EA export to the declared schema, in place, and add the day of each sample (DAY_COLUMN, datetime64 floored to the day)
+	and the int8 code of its result qualifier (QUALIFIER_COLUMN), so that dates and qualifiers are parsed once at load instead of in every query.
+	Columns not present in the frame are skipped; determinand codes that do not fit in int16 are kept as int32.
+	"""
+	for column, dtype in SCHEMA.items():
+		if column not in df.columns or df[column].dtype == dtype:
+			continue
+		if dtype == 'int16':
+			codes = pd.to_numeric(df[column])
+			if codes.max() > np.iinfo(np.int16).max:
+				dtype = 'int32'
+			df[column] = codes.astype(dtype)
+		elif dtype == 'float32':
+			df[column] = pd.to_numeric(df[column], errors="coerce").astype(dtype)
+		else:
+			df[column] = df[column].astype(dtype)
+	for column in DATE_COLUMNS:
+		if column in df.columns and not pd.api.types.is_datetime64_any_dtype(df[column]):
+			df[column] = pd.to_datetime(df[column])
+	if DATE_COLUMNS[0] in df.columns and DAY_COLUMN not in df.columns:
+		df[DAY_COLUMN] = df[DATE_COLUMNS[0]].dt.normalize()
+	if 'resultQualifier.notation' in df.columns and QUALIFIER_COLUMN not in df.columns:
+		df[QUALIFIER_COLUMN] = qualifier_codes(df['resultQualifier.notation'])
+	if "Unnamed: 0" in df.columns:
+		df.drop(columns="Unnamed: 0", inplace=True)
+	return df
+
+
+def read_govdat_csv(path, usecols=None, **kwargs):
+	"""
+	Read the Environment Agency export (e.g. govdat.csv) with the declared schema, without any cache.
+
+	input:
+	path (str): path of the csv file
+	usecols (list of str, optional): only read these columns; DAY_COLUMN and QUALIFIER_COLUMN are derived from sample.sampleDateTime and resultQualifier.notation, not read
+	**kwargs: passed on to pandas.read_csv
+
+	output:
+	df (DataFrame object)
+	"""
+	header = pd.read_csv(path, nrows=0).columns
+	dtype = {column: dtype for column, dtype in SCHEMA.items() if column in header and dtype != 'int16'}
+	parse_dates = [column for column in DATE_COLUMNS if column in header]
+	if usecols is not None:
+		usecols = [column for column in usecols if column not in (DAY_COLUMN, QUALIFIER_COLUMN)]
+		dtype = {column: dtype[column] for column in dtype if column in usecols}
+		parse_dates = [column for column in parse_dates if column in usecols]
+	df = pd.read_csv(path, usecols=usecols, dtype=dtype, parse_dates=parse_dates, low_memory=False, **kwargs)
+	return _apply_schema(df)
+
+
+def load_govdat(path='govdat.csv', cache=True, cache_format="feather", refresh=False, usecols=None, writable=False):
+	"""
+	Return the Environment Agency dataset as a compact, typed DataFrame.
+	The first call parses the csv and writes a columnar cache next to it (govdat.feather or govdat.parquet);
+	later calls memory-map the cache instead of re-parsing the csv. With the (uncompressed) feather cache the numeric
+	and date columns are not copied: they stay backed by the memory-mapped file, and pages are only read from disk when
+	used. The parquet cache is decoded into memory.
+	The cache is rebuilt when the csv is newer than the cache, or when refresh is True.
+
+	input:
+	path (str): path of the csv file, e.g. "govdat.csv"
+	cache (bool or str): True (cache next to the csv), a path for the cache file, or False (no cache)
+	cache_format (str): either "feather" (Arrow IPC, memory-mapped) or "parquet"
+	refresh (bool): force the csv to be re-parsed and the cache to be rewritten
+	usecols (list of str, optional): only return these columns
+	writable (bool): False (columns backed by the memory map, read-only); True (columns copied into memory, as a parsed csv)
+
+	output:
+	df (DataFrame object)
+
+	.. warning::
+	The cache requires pyarrow; without it the csv is parsed on every call.
+	Columns backed by the memory map are read-only: assigning values in place (e.g. df.loc[i, "result"] = x) raises
+	ValueError; load with writable=True, or copy the frame, before editing it. Adding or replacing whole columns works.
+	"""
+	if cache is False:
+		return read_govdat_csv(path, usecols=usecols)
+
+	cache_file = _cache_path(path, cache_format) if cache is True else cache
+	cache_format = CACHE_FORMATS.get(os.path.splitext(cache_file)[1], cache_format)
+
+	try:
+		import pyarrow.feather as feather
+		import pyarrow.parquet as parquet
+	except ImportError:
+		return read_govdat_csv(path, usecols=usecols)
+
+	stale = (not os.path.exists(cache_file)) or (os.path.exists(path) and os.path.getmtime(path) > os.path.getmtime(cache_file))
+	if refresh or stale:
+		df = read_govdat_csv(path)
+		if cache_format == "parquet":
+			df.to_parquet(cache_file, index=False)
+		else:
+			df.reset_index(drop=True).to_feather(cache_file, compression="uncompressed")
+		if usecols is not None:
+			df = df[list(usecols)]
+		return df
+
+	if cache_format == "parquet":
+		table = parquet.read_table(cache_file, columns=usecols, memory_map=True)
+	else:
+		table = feather.read_table(cache_file, columns=usecols, memory_map=True)
+	if writable:
+		return table.to_pandas()
+	return table.to_pandas(split_blocks=True, self_destruct=True)
+
+
+def read_govdat_filtered(path, places=None, determinands=None, start=None, end=None, location_type="notation", chunksize=500000, usecols=None):
+	"""
+	Stream the csv in chunks and return only the rows matching the location, determinand and date predicates,
+	for exports that do not fit in memory. Peak memory is bounded by the chunk size plus the matching rows.
+
+	input:
+	path (str): path of the csv file
+	places (str or list of str, optional): the location(s) of interest, matched as in loc_subset, e.g. ["G0003616", "G0003625"]
+	determinands (list of int, optional): the determinands of interest, e.g. [111, 116]
+	start, end (str or Timestamp, optional): first and last sample time of interest, e.g. "2010-01-01"
+	location_type (str): either "label" (e.g. "langstone", "portsmouth") or "notation" (e.g. "SO-G00", "SW-Z94")
+	chunksize (int): number of csv rows parsed at a time
+	usecols (list of str, optional): only read these columns; DAY_COLUMN and QUALIFIER_COLUMN are derived, as in read_govdat_csv
+
+	output:
+	df_subset (DataFrame object): typed as load_govdat
+	"""
+	location_column = {"label": 'sample.samplingPoint.label', "notation": 'sample.samplingPoint.notation'}[location_type]
+	tokens = None if places is None else [str(place).lower() for place in np.atleast_1d(places)]
+	start = None if start is None else pd.Timestamp(start)
+	end = None if end is None else pd.Timestamp(end)
+
+	dtype = {column: dtype for column, dtype in SCHEMA.items() if dtype not in ('category', 'int16')}
+	if usecols is not None:
+		usecols = [column for column in usecols if column not in (DAY_COLUMN, QUALIFIER_COLUMN)]
+	matches = {}
+	subsets = []
+	for chunk in pd.read_csv(path, chunksize=chunksize, usecols=usecols, dtype=dtype, low_memory=False):
+		keep = np.ones(len(chunk), dtype=bool)
+		if determinands is not None:
+			keep &= chunk['determinand.notation'].isin(determinands).to_numpy()
+		if tokens is not None:
+			for value in pd.unique(chunk[location_column]):
+				if value not in matches:
+					matches[value] = isinstance(value, str) and any(token in value.lower() for token in tokens)
+			keep &= chunk[location_column].isin([value for value, match in matches.items() if match]).to_numpy()
+		chunk = chunk[keep]
+		if start is not None or end is not None:
+			sample_time = pd.to_datetime(chunk['sample.sampleDateTime'])
+			keep = np.ones(len(chunk), dtype=bool)
+			if start is not None:
+				keep &= (sample_time >= start).to_numpy()
+			if end is not None:
+				keep &= (sample_time <= end).to_numpy()
+			chunk = chunk[keep]
+		subsets.append(chunk)
+
+	df_subset = pd.concat(subsets, ignore_index=True)
+	return _apply_schema(df_subset)
@@ -1,173 +1,598 @@
 import pandas as pd
 import matplotlib.pyplot as plt
 import numpy as np
+import functools
+import inspect
+import weakref
+from collections import OrderedDict
 
+from WaterQualityFunction_store import PartitionedStore
+from WaterQualityFunction_index import SamplingPointIndex
+import WaterQualityFunction_determinand as wqfd
+from WaterQualityFunction_profile import profiled
+from WaterQualityFunction_load import QUALIFIER_COLUMN, QUALIFIERS
+from WaterQualityFunction_query import SEASON_MONTHS, Query, _qualifier, _sample_day, format_dates
 
-def loc_subset(df, place, location_type="label"):
+
+
+class QueryCache:
 	"""
-	Return a subsample of the main dataset, according to the location of interest
+	LRU cache of the (time, value) results of the extraction functions, bounded by a memory budget.
 
 	input:
-	df (DataFrame object)
-	location_label (str): the location of interest, e.g. "langstone" or "SO-G00"; empty string "" return entire catalogue
+	max_bytes (int): memory budget of the cached results; least recently used results are evicted beyond it
+	"""
+
+	def __init__(self, max_bytes=256 * 2**20):
+		self.max_bytes = max_bytes
+		self.entries = OrderedDict()
+		self.nbytes = 0
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+
+	def get(self, key):
+		if key not in self.entries:
+			self.misses += 1
+			return None
+		self.hits += 1
+		self.entries.move_to_end(key)
+		return self.entries[key][0]
+
+	def put(self, key, value):
+		nbytes = _result_nbytes(value)
+		if nbytes > self.max_bytes:
+			return
+		if key in self.entries:
+			self.nbytes -= self.entries.pop(key)[1]
+		self.entries[key] = (value, nbytes)
+		self.nbytes += nbytes
+		while self.nbytes > self.max_bytes:
+			self.nbytes -= self.entries.popitem(last=False)[1][1]
+			self.evictions += 1
+
+	def stats(self):
+		return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "entries": len(self.entries), "nbytes": self.nbytes, "max_bytes": self.max_bytes}
+
+
+_query_cache = None
+_generations = {}
+_watched = set()
+
+
+def enable_cache(max_bytes=256 * 2**20):
+	"""
+	Memoize nutrient_time, nutrient_time_seasons, DAIN_time and DAIN_time_seasons, keyed on the identity of the frame
+	(frame_fingerprint: its id, generation, shape and columns) and the query arguments. A hit costs a dictionary lookup.
+
+	input:
+	max_bytes (int): memory budget of the cache, default 256 MB
+
+	.. warning::
+	Cached results are shared between calls and must not be modified in place.
+	The rows are not hashed: after editing a frame in place, call invalidate(df), or its cached results are served stale.
+	Appending with WaterQualityFunction_update returns a new frame, see carry_over_cache.
+	With a PartitionedStore results are keyed on the modification time of the store instead.
+	"""
+	global _query_cache
+	_query_cache = QueryCache(max_bytes)
+
+
+def disable_cache():
+	global _query_cache
+	_query_cache = None
+
+
+def clear_cache():
+	if _query_cache is not None:
+		enable_cache(_query_cache.max_bytes)
+
+
+def cache_stats():
+	"""
+	Return hits, misses, evictions, number of entries and bytes of the query cache (None if the cache is disabled).
+	"""
+	if _query_cache is None:
+		return None
+	return _query_cache.stats()
+
+
+def _frame(df):
+	return df.df if isinstance(df, SamplingPointIndex) else df
+
+
+def frame_generation(df):
+	"""
+	Return the generation of a frame: 0, incremented by each invalidate(df).
+	"""
+	return _generations.get(id(_frame(df)), 0)
+
+
+def _drop_entries(key):
+	if _query_cache is not None:
+		for entry in [entry for entry in _query_cache.entries if entry[1][0] == key]:
+			_query_cache.nbytes -= _query_cache.entries.pop(entry)[1]
+
+
+def _forget(key):
+	"""
+	Drop the cached results and generation of a frame that was garbage collected, so that a new frame reusing its id
+	is never served its results.
+	"""
+	_drop_entries(key)
+	_generations.pop(key, None)
+	_watched.discard(key)
+
+
+def _watch(df):
+	key = id(df)
+	if key not in _watched:
+		_watched.add(key)
+		weakref.finalize(df, _forget, key)
+
+
+def invalidate(df=None):
+	"""
+	Mark a frame as modified in place: its cached results are dropped and later queries are recomputed.
+	Without a frame, the whole cache is cleared.
+
+	input:
+	df (DataFrame object or SamplingPointIndex, optional)
+	"""
+	if df is None:
+		clear_cache()
+		return
+	df = _frame(df)
+	_watch(df)
+	_generations[id(df)] = _generations.get(id(df), 0) + 1
+	_drop_entries(id(df))
+
+
+def frame_fingerprint(df):
+	"""
+	Return the identity of a frame: its id, generation (see invalidate), shape and columns (the path and modification time of a PartitionedStore).
+	"""
+	if isinstance(df, PartitionedStore):
+		return df.fingerprint()
+	df = _frame(df)
+	return (id(df), _generations.get(id(df), 0), df.shape, tuple(df.columns))
+
+
+def _hashable(value):
+	if isinstance(value, dict):
+		return tuple((key, _hashable(item)) for key, item in value.items())
+	if isinstance(value, (list, tuple, np.ndarray)):
+		return tuple(_hashable(item) for item in value)
+	return value
+
+
+def _result_nbytes(value):
+	if isinstance(value, tuple):
+		return sum(_result_nbytes(item) for item in value)
+	if isinstance(value, (pd.Series, pd.DataFrame)):
+		return int(np.sum(value.memory_usage(deep=True)))
+	return getattr(value, "nbytes", 0)
+
+
+_memoized = {}
+
+
+def _memoize(function):
+	"""
+	Serve the results of an extraction function from the query cache, when enabled.
+	"""
+	_memoized[function.__name__] = function
+
+	@functools.wraps(function)
+	def wrapper(df, *args, **kwargs):
+		if _query_cache is None:
+			return function(df, *args, **kwargs)
+		key = (function.__name__, frame_fingerprint(df), _hashable(args), _hashable(sorted(kwargs.items())))
+		result = _query_cache.get(key)
+		if result is None:
+			result = function(df, *args, **kwargs)
+			if not isinstance(df, PartitionedStore):
+				_watch(_frame(df))
+			_query_cache.put(key, result)
+		return result
+	return wrapper
+
+
+def carry_over_cache(df_old, df_new, sampling_points):
+	"""
+	Move the cached results of df_old to df_new, except those of the locations matching the given sampling points,
+	e.g. after WaterQualityFunction_update.append_samples: only the queries touching the updated sites are recomputed.
+
+	input:
+	df_old, df_new (DataFrame object): the frame before and after the update
+	sampling_points (DataFrame object): the 'sample.samplingPoint.notation' and 'sample.samplingPoint.label' of the updated sites
+
+	output:
+	carried, dropped (int): number of cached results moved to df_new and discarded
+	"""
+	if _query_cache is None:
+		return(0, 0)
+	old_fingerprint = frame_fingerprint(df_old)
+	new_fingerprint = frame_fingerprint(df_new)
+	tokens = {
+		"label": sampling_points['sample.samplingPoint.label'].astype(str).str.lower().tolist(),
+		"notation": sampling_points['sample.samplingPoint.notation'].astype(str).str.lower().tolist(),
+	}
+
+	_watch(_frame(df_new))
+	carried = dropped = 0
+	for key in [key for key in _query_cache.entries if key[1] == old_fingerprint]:
+		name, _, args, kwargs = key
+		value, nbytes = _query_cache.entries.pop(key)
+		_query_cache.nbytes -= nbytes
+		arguments = inspect.signature(_memoized[name]).bind(None, *args, **dict(kwargs))
+		arguments.apply_defaults()
+		places = [str(place).lower() for place in np.atleast_1d(arguments.arguments["location"])]
+		if any(place in token for place in places for token in tokens[arguments.arguments["location_type"]]):
+			dropped += 1
+			continue
+		_query_cache.put((name, new_fingerprint, args, kwargs), value)
+		carried += 1
+	return(carried, dropped)
+
+
+@profiled
+def loc_subset(df, place, location_type="label", duplicates="drop", columns=None):
+	"""
+	Return a subsample of the main dataset, according to the location(s) of interest.
+	All the places are matched at once against the unique labels/notations (one compiled regex), and the rows are
+	selected with a single take (a slice when they are consecutive); same as Query(df).sites(place, location_type, duplicates).frame(columns).
+
+	input:
+	df (DataFrame object, SamplingPointIndex or PartitionedStore): with a SamplingPointIndex the sampling points are looked up in the index instead of scanning the frame; with a PartitionedStore only the partitions of the location are read
+	place (str or list of str): the location(s) of interest, e.g. "langstone", "SO-G00" or ["G0003616", "G0003625"]; empty string "" return entire catalogue
 	location_type (str): either "label" (e.g. "langstone", "portsmouth") or "notation" (e.g. "SO-G00", "SW-Z94")
+	duplicates (str): "drop" (each row once, in the order of the frame); "keep" (the rows of each place in turn, a row matching two places appears twice, as the former concatenation of the places)
+	columns (list of str, optional): only carry these columns, e.g. WaterQualityFunction_query.SERIES_COLUMNS instead of the ~20 columns of the export; a PartitionedStore only reads these
 	
 	output:
 	df_subset (DataFrame object)
 
 	.. warning:: 
-	Performs **no** checks of the input.
+	Performs **no** checks of the input. SamplingPointIndex and PartitionedStore always drop duplicates.
 
 	"""
 
-	if location_type == "label":
+	return Query(df).sites(place, location_type, duplicates).frame(columns)
 
-		locations = set(df['sample.samplingPoint.label'])
-        
-		if np.size(place)>1:
-			location_condition = [x for x in locations if place[0] in x.lower()]
-			df_subset = df.loc[df['sample.samplingPoint.label'].isin(location_condition)].copy()
-			for place_ in place[1:]:
-				location_condition = [x for x in locations if place_ in x.lower()]
-				df_subset_0 = df.loc[df['sample.samplingPoint.label'].isin(location_condition)].copy()
 
-				df_subset = pd.concat([df_subset, df_subset_0])
-                
-		else:     
+CENSORING = ("raw", "half", "exclude", "flag")
 
-			location_condition = [x for x in locations if place.lower() in x.lower()]
-			df_subset = df.loc[df['sample.samplingPoint.label'].isin(location_condition)].copy()
-	if location_type == "notation":
-   
-		locations_notations = set(df['sample.samplingPoint.notation'])
-        
-		if np.size(place)>1:
-			location_condition = [x for x in locations_notations if place[0] in x.lower()]
-			df_subset = df.loc[df['sample.samplingPoint.notation'].isin(location_condition)].copy()
-			for place_ in place[1:]:
-				location_condition = [x for x in locations_notations if place_.lower() in x.lower()]
-				df_subset_0 = df.loc[df['sample.samplingPoint.notation'].isin(location_condition)].copy()
-				df_subset = pd.concat([df_subset, df_subset_0])
-		else:     
-			location_condition = [x for x in locations_notations if place.lower() in x.lower()]
-			df_subset = df.loc[df['sample.samplingPoint.notation'].isin(location_condition)].copy()
 
-	return df_subset
+def censor(df_env, method="raw"):
+	"""
+	Handle the results below the limit of detection of a subset, on whole columns: a result qualified "<" is the limit itself
+	(WaterQualityFunction_load.qualifier_codes).
 
+	input:
+	df_env (DataFrame object): with "result" and "qualifier" (or 'resultQualifier.notation') columns, e.g. from Query(df).frame([...])
+	method (str): "raw" (results as reported); "half" (half the limit of detection); "exclude" (results below the limit dropped);
+	"flag" (results as reported, plus a boolean "censored" column)
+
+	output:
+	df_censored (DataFrame object)
+
+	.. warning::
+	Any method but "raw" raises ValueError if df_env has neither qualifier column (e.g. a frame loaded with usecols without them).
+	"""
+	if method == "raw":
+		return df_env
+	if method not in CENSORING:
+		raise ValueError("unknown censoring %s, expected one of %s" % (method, CENSORING))
+	below = _qualifier(df_env).to_numpy() == QUALIFIERS["<"]
+	if method == "half":
+		result = df_env["result"].to_numpy()
+		return df_env.assign(result=np.where(below, result / 2, result).astype(result.dtype, copy=False))
+	if method == "exclude":
+		return df_env[~below]
+	return df_env.assign(censored=below)
 
-def nutrient_time(df, location, nutrient_determinand, location_type="label"):
+
+@profiled
+@_memoize
+def nutrient_time(df, location, nutrient_determinand, location_type="label", date_format="datetime64", censoring="raw"):
 	"""
 	Return a plot nutrient VS time for a given location, diveded or not into winter (oct-march) and summer (apr-sept).
 	
 	input:
 	df (DataFrame object)
 	location (str): the location of interest, e.g. "langstone"; empty string "" return entire catalogue
-	nutrient_determinand (int): the determinant of the nutrient, e.g. 118 for Nitrite (N), mg/l
+	nutrient_determinand (int): the determinant of the nutrient, e.g. 118 for Nitrite (N), mg/l; a list of determinants or a family name of WaterQualityFunction_determinand.FAMILIES, e.g. "ammonia"
 	ax(Axes object)
 	seasons (bool): False (no distinction in seasons); True (divided into seasons)
 	location_type (str): either "label" (e.g. "langstone", "portsmouth") or "notation" (e.g. "SO-G00", "SW-Z94")
+	date_format (str): "datetime64", "date" (datetime.date objects) or "epoch" (float days), see format_dates
+	censoring (str): results below the limit of detection, see censor: "raw", "half", "exclude" or "flag" (a boolean array of the censored results is returned third)
 	
 	output:
 	ax (Axes object)
 	"""
-	df_env = loc_subset(df, location, location_type)
-	df_env.loc[:,"Date"] = pd.to_datetime(df_env['sample.sampleDateTime']).dt.date
-    
-	if np.size(nutrient_determinand)>1:
-		time = []
-		nutrients = []
+	query = Query(df).sites(location, location_type).determinands(nutrient_determinand)
+	return query.series(date_format, None if censoring == "raw" else functools.partial(censor, method=censoring))
+
+
+@profiled
+def season_split(df, location, location_type="label", season_months=SEASON_MONTHS):
+	"""
+	Return the subsample of a location split into seasons, with a single Query and no date parsing beyond the first load.
+	Each row is tagged with the code of its season (the position of the season in season_months) in a "season" column;
+	rows are sorted by season and date (samples of the same day by sampling point), and each season is returned as a slice of the same frame.
+
+	input:
+	df (DataFrame object)
+	location (str): the location of interest, e.g. "langstone"; empty string "" return entire catalogue
+	location_type (str): either "label" (e.g. "langstone", "portsmouth") or "notation" (e.g. "SO-G00", "SW-Z94")
+	season_months (dict): season name -> months of the season, default summer (may-aug) and winter (oct-march)
+
+	output:
+	seasons (dict): season name -> DataFrame object, sorted by date
+	"""
+	return Query(df).sites(location, location_type).split_seasons(season_months)
+
+
+@profiled
+def _time_series(df_env, nutrient_determinand):
+	"""
+	Return (time, nutrient) of one or more determinands from a subsample already sorted by date:
+	as Series for a single determinand (also given as a one-element list, e.g. the family "chlorophyll"), as arrays for several;
+	with a "censored" column (censor(..., "flag")), the censored flags are returned third.
+	"""
+	nutrient_determinand = np.atleast_1d(nutrient_determinand)
+	columns = ["Date", "result"] + (["censored"] if "censored" in df_env.columns else [])
+	if len(nutrient_determinand)>1:
+		series = {column: [] for column in columns}
 		for n in nutrient_determinand:
-			time.append(df_env[df_env['determinand.notation'] == n].sort_values(by="Date", ascending=True)['Date'])
-			nutrients.append(df_env[df_env['determinand.notation'] == n].sort_values(by="Date", ascending=True)['result'])
-		time = np.concatenate(time).flatten()
-		nutrient = np.concatenate(nutrients).flatten()
-	else:
-		time = df_env[df_env['determinand.notation'] ==nutrient_determinand].sort_values(by="Date", ascending=True)['Date']
-		nutrient = df_env[df_env['determinand.notation'] ==nutrient_determinand].sort_values(by="Date", ascending=True)['result']
-	return(time, nutrient)
-    
-    
-	
-	
+			df_n = df_env[df_env['determinand.notation'] == n]
+			for column in columns:
+				series[column].append(df_n[column])
+		return tuple(np.concatenate(series[column]).flatten() for column in columns)
+	df_n = df_env[df_env['determinand.notation'] == nutrient_determinand[0]]
+	return tuple(df_n[column] for column in columns)
 
-def nutrient_time_seasons(df, location, nutrient_determinand, location_type="label"):	
+
+@profiled
+@_memoize
+def nutrient_time_seasons(df, location, nutrient_determinand, location_type="label", season_months=SEASON_MONTHS, date_format="datetime64", censoring="raw"):	
 	"""
-	Return a plot nutrient VS time for a given location, diveded or not into winter (oct-march) and summer (apr-sept).
+	Return nutrient VS time for a given location, diveded into winter (oct-march) and summer (may-aug).
 	
 	input:
 	df (DataFrame object)
 	location (str): the location of interest, e.g. "langstone"; empty string "" return entire catalogue
-	nutrient_determinand (int): the determinant of the nutrient, e.g. 118 for Nitrite (N), mg/l
-	ax(Axes object)
-	seasons (bool): False (no distinction in seasons); True (divided into seasons)
+	nutrient_determinand (int): the determinant of the nutrient, e.g. 118 for Nitrite (N), mg/l; a list of determinants or a family name of WaterQualityFunction_determinand.FAMILIES, e.g. "ammonia"
 	location_type (str): either "label" (e.g. "langstone", "portsmouth") or "notation" (e.g. "SO-G00", "SW-Z94")
+	season_months (dict): months of "summer" and "winter", see season_split
+	date_format (str): "datetime64", "date" (datetime.date objects) or "epoch" (float days), see format_dates
+	censoring (str): results below the limit of detection, see censor: "raw", "half", "exclude" or "flag" (the censored flags of each season follow its nutrients)
 	
 	output:
-	ax (Axes object)
+	time_summer, nutrients_summer, time_winter, nutrients_winter; with "flag", time_summer, nutrients_summer, censored_summer, time_winter, nutrients_winter, censored_winter
 	"""
-	
+	nutrient_determinand = wqfd.codes(nutrient_determinand)
+	columns = ["Date", 'determinand.notation', "result"] + ([QUALIFIER_COLUMN] if censoring != "raw" else [])
+	seasons = Query(df).sites(location, location_type).determinands(nutrient_determinand).split_seasons(season_months, columns)
 
-	df_env_summer = loc_subset(df.loc[(df["month"]>4)&(df["month"]<9)], location, location_type)
-	df_env_summer.loc[:,"Date"] = pd.to_datetime(df_env_summer['sample.sampleDateTime']).dt.date
-
-	df_env_winter = loc_subset(df.loc[np.logical_or(df["month"]<4,df["month"]>9)], location, location_type)
-	df_env_winter.loc[:,"Date"] = pd.to_datetime(df_env_winter['sample.sampleDateTime']).dt.date
-    
-    
-	if np.size(nutrient_determinand)>1:
-		time_summer = []
-		nutrients_summer = []
-		time_winter = []
-		nutrients_winter = []
-		for n in nutrient_determinand:
-			time_summer.append(df_env_summer[df_env_summer['determinand.notation'] == n].sort_values(by="Date", ascending=True)['Date'])
-			nutrients_summer.append(df_env_summer[df_env_summer['determinand.notation'] == n].sort_values(by="Date", ascending=True)['result'])
-            
-			time_winter.append(df_env_winter[df_env_winter['determinand.notation'] == n].sort_values(by="Date", ascending=True)['Date'])
-			nutrients_winter.append(df_env_winter[df_env_winter['determinand.notation'] == n].sort_values(by="Date", ascending=True)['result'])
-        
-		time_summer = np.concatenate(time_summer).flatten()
-		nutrients_summer = np.concatenate(nutrients_summer).flatten()
-        
-		time_winter = np.concatenate(time_winter).flatten()
-		nutrients_winter = np.concatenate(nutrients_winter).flatten()
-	else:
-		time_summer = df_env_summer[df_env_summer['determinand.notation'] ==nutrient_determinand].sort_values(by="Date", ascending=True)['Date']
-		nutrients_summer = df_env_summer[df_env_summer['determinand.notation'] ==nutrient_determinand].sort_values(by="Date", ascending=True)['result']
-		time_winter = df_env_winter[df_env_winter['determinand.notation'] ==nutrient_determinand].sort_values(by="Date", ascending=True)['Date']
-		nutrients_winter = df_env_winter[df_env_winter['determinand.notation'] ==nutrient_determinand].sort_values(by="Date", ascending=True)['result']
-	return(time_summer, nutrients_summer, time_winter, nutrients_winter)
+	output = ()
+	for season in ("summer", "winter"):
+		series = _time_series(censor(seasons[season], censoring), nutrient_determinand)
+		output += (format_dates(series[0], date_format),) + series[1:]
+	return output
 
 		
 
 	
 	
-def DAIN_time(df, location, location_type="label"):
-	df_env =  loc_subset(df,  location, location_type)
-	df_env.loc[:,"Date"] = pd.to_datetime(df_env['sample.sampleDateTime']).dt.date
-	
-	df_NA = df_env[(df_env["determinand.notation"]==116)|(df_env["determinand.notation"]==9943)|(df_env["determinand.notation"]==111)|(df_env["determinand.notation"]==119)]
-	dain = df_NA.groupby("Date")["result"].sum().reset_index()
-	date_ = dain["Date"]
-	dain_ = dain["result"]	
+@profiled
+def DAIN_pairs(df_env, determinands=wqfd.FAMILIES["DAIN_paired"], paired=True):
+	"""
+	Return the DAIN (sum of the nitrogen determinands) of a location subset, computed in one pass over all the dates.
+
+	input:
+	df_env (DataFrame object): subset of the main dataset with a "Date" column, e.g. from loc_subset; with a "censored" column (censor(..., "flag")) the dates with a censored result are flagged
+	determinands (list of int or str): the determinands summed, e.g. (111, 116), or a family of WaterQualityFunction_determinand.FAMILIES, e.g. "DAIN"
+	paired (bool): True (first result of each determinand, only dates where all the determinands are present, as WaterQualityFunction.DAIN: NaN if one of them is NaN); False (sum of all the results of the date, as DAIN_time, NaN results skipped)
+
+	output:
+	date_ (Series object), dain_ (Series object), and censored_ (Series object of bool) if df_env has a "censored" column
+	"""
+	determinands = wqfd.codes(determinands)
+	flagged = "censored" in df_env.columns
+	columns = ["Date", "determinand.notation", "result"] + (["censored"] if flagged else [])
+	df_NA = df_env.iloc[wqfd.determinand_rows(df_env, determinands), df_env.columns.get_indexer(columns)]
+	if paired:
+		df_NA = df_NA.drop_duplicates(subset=["Date", "determinand.notation"])
+	aggregations = {"sum": ("result", "sum"), "size": ("result", "size"), "count": ("result", "count")}
+	if flagged:
+		aggregations["censored"] = ("censored", "any")
+	dain = df_NA.groupby("Date", sort=True).agg(**aggregations)
+	if paired:
+		dain = dain[dain["size"] == len(set(determinands))]
+		dain["sum"] = dain["sum"].where(dain["count"] == dain["size"])
+	dain = dain.rename(columns={"sum": "result"}).reset_index()
+	if flagged:
+		return(dain["Date"], dain["result"], dain["censored"])
+	return(dain["Date"], dain["result"])
+
+
+@profiled
+@_memoize
+def DAIN_time(df, location, location_type="label", date_format="datetime64", censoring="raw", paired=False):
+	"""
+	Return the DAIN VS time of a location: the sum of the nitrogen determinands of the DAIN family sampled on each date.
+
+	input:
+	df (DataFrame object)
+	location (str): the location of interest, e.g. "langstone"; empty string "" return entire catalogue
+	location_type (str): either "label" (e.g. "langstone", "portsmouth") or "notation" (e.g. "SO-G00", "SW-Z94")
+	date_format (str): "datetime64", "date" (datetime.date objects) or "epoch" (float days), see format_dates
+	censoring (str): results below the limit of detection, see censor: "raw", "half", "exclude" or "flag" (the dates with a censored result are returned third)
+	paired (bool): False (sum of the DAIN family); True (the "DAIN_paired" family, first result of each determinand, as WaterQualityFunction.DAIN), see DAIN_pairs
+
+	output:
+	dain_, date_
+	"""
+	family = "DAIN_paired" if paired else "DAIN"
+	columns = ["Date", 'determinand.notation', "result"] + ([QUALIFIER_COLUMN] if censoring != "raw" else [])
+	df_env = censor(Query(df).sites(location, location_type).determinands(family).frame(columns), censoring)
+	series = DAIN_pairs(df_env, family, paired=paired)
 				
-	return(dain_, date_)
-		
-def DAIN_time_seasons(df, location, location_type="label"):
-	df_env_summer =  loc_subset(df.loc[(df["month"]>4)&(df["month"]<9)], location, location_type)
-	df_env_summer.loc[:,"Date"] = pd.to_datetime(df_env_summer['sample.sampleDateTime']).dt.date
-
-	df_NA_summer = df_env_summer[(df_env_summer["determinand.notation"]==116)|(df_env_summer["determinand.notation"]==9943)|(df_env_summer["determinand.notation"]==111)|(df_env_summer["determinand.notation"]==119)]
-	dain_summer = df_NA_summer.groupby("Date")["result"].sum().reset_index()
-	date_summer = dain_summer["Date"]
-	dain_summer = dain_summer["result"]
-	
-	
-	df_env_winter =  loc_subset(df.loc[np.logical_or(df["month"]<4,df["month"]>9)], location, location_type)
-	df_env_winter.loc[:,"Date"] = pd.to_datetime(df_env_winter['sample.sampleDateTime']).dt.date
+	return(series[1], format_dates(series[0], date_format)) + tuple(series[2:])
 		
-	df_NA_winter = df_env_winter[(df_env_winter["determinand.notation"]==116)|(df_env_winter["determinand.notation"]==9943)|(df_env_winter["determinand.notation"]==111)|(df_env_winter["determinand.notation"]==119)]
-	dain_winter = df_NA_winter.groupby("Date")["result"].sum().reset_index()
-	date_winter = dain_winter["Date"]
-	dain_winter = dain_winter["result"]
-	return(date_summer, dain_summer, date_winter, dain_winter)
+@profiled
+@_memoize
+def DAIN_time_seasons(df, location, location_type="label", season_months=SEASON_MONTHS, date_format="datetime64", censoring="raw", paired=False):
+	"""
+	Return the DAIN VS time of a location divided into summer and winter.
+
+	input:
+	df (DataFrame object)
+	location (str): the location of interest, e.g. "langstone"; empty string "" return entire catalogue
+	location_type (str): either "label" (e.g. "langstone", "portsmouth") or "notation" (e.g. "SO-G00", "SW-Z94")
+	season_months (dict): months of "summer" and "winter", see season_split
+	date_format (str): "datetime64", "date" (datetime.date objects) or "epoch" (float days), see format_dates
+	censoring (str): results below the limit of detection, see censor: "raw", "half", "exclude" or "flag" (the dates with a censored result follow the DAIN of each season)
+	paired (bool): False (sum of the DAIN family); True (the "DAIN_paired" family, first result of each determinand, as WaterQualityFunction.DAIN), see DAIN_pairs
+
+	output:
+	date_summer, dain_summer, date_winter, dain_winter; with "flag", date_summer, dain_summer, censored_summer, date_winter, dain_winter, censored_winter
+	"""
+	family = "DAIN_paired" if paired else "DAIN"
+	columns = ["Date", 'determinand.notation', "result"] + ([QUALIFIER_COLUMN] if censoring != "raw" else [])
+	seasons = Query(df).sites(location, location_type).determinands(family).split_seasons(season_months, columns)
+
+	output = ()
+	for season in ("summer", "winter"):
+		series = DAIN_pairs(censor(seasons[season], censoring), family, paired=paired)
+		output += (format_dates(series[0], date_format),) + series[1:]
+	return output
+
+
+@profiled
+def batch_time(df, notations, determinands, seasons=False, season_months=SEASON_MONTHS, as_dict=False):
+	"""
+	Return the nutrient VS time series of every (site, determinand, season) combination, with a single filter, sort and groupby
+	instead of one loc_subset and one nutrient_time per site and determinand.
+
+	input:
+	df (DataFrame object, SamplingPointIndex or PartitionedStore)
+	notations (list of str): the sampling points of interest, matched as in loc_subset(..., "notation"), e.g. ["G0003368", "G0003508"]; an empty list gives an empty result
+	determinands (list of int or str): the determinands of interest, e.g. [111, 116], or a family of WaterQualityFunction_determinand.FAMILIES, e.g. "ammonia"
+	seasons (bool): False (season "all"); True (divided into the seasons of season_months, rows outside them are dropped)
+	season_months (dict): season name -> months of the season, see season_split
+	as_dict (bool): False (tidy long frame); True (dict of arrays)
+
+	output:
+	df_long (DataFrame object): columns "site", "determinand", "season", "Date", "result", sorted by site, determinand, season and date
+	or, if as_dict is True, series (dict): (site, determinand, season) -> (time ndarray, result ndarray)
+	"""
+	notations = list(np.atleast_1d(notations))
+	determinands = list(np.atleast_1d(wqfd.codes(determinands)))
+	if not notations:
+		return {} if as_dict else pd.DataFrame(columns=["site", "determinand", "season", "Date", "result"])
+	if isinstance(df, PartitionedStore):
+		df = df.read(notations, "notation", determinands=determinands)
+	if isinstance(df, SamplingPointIndex):
+		df = df.df
+	columns = ['sample.samplingPoint.notation', 'determinand.notation', 'sample.sampleDateTime', 'result'] + (["Date"] if "Date" in df.columns else [])
+	df_det = df.iloc[wqfd.determinand_rows(df, determinands), df.columns.get_indexer(columns)]
+
+	site_notations = pd.Series(pd.unique(df_det['sample.samplingPoint.notation']), dtype=object).dropna()
+	mapping = pd.concat([pd.DataFrame({'sample.samplingPoint.notation': site_notations[site_notations.str.lower().str.contains(str(site).lower(), regex=False)], "site": site}) for site in notations])
+	df_long = df_det.merge(mapping, on='sample.samplingPoint.notation', how="inner")
+
+	df_long["Date"] = _sample_day(df_long)
+	if seasons:
+		month = df_long["Date"].dt.month.to_numpy()
+		season = np.full(len(df_long), None, dtype=object)
+		for name, months in season_months.items():
+			season[np.isin(month, months)] = name
+		df_long["season"] = season
+		df_long = df_long[df_long["season"].notna()]
+	else:
+		df_long["season"] = "all"
+
+	df_long = df_long.rename(columns={'determinand.notation': "determinand"})[["site", "determinand", "season", "Date", "result"]]
+	df_long = df_long.sort_values(by=["site", "determinand", "season", "Date"], kind="stable").reset_index(drop=True)
+	if not as_dict:
+		return df_long
+
+	series = {}
+	for key, indices in df_long.groupby(["site", "determinand", "season"], sort=False).indices.items():
+		series[key] = (df_long["Date"].to_numpy()[indices], df_long["result"].to_numpy()[indices])
+	return series
+
+
+PIVOT_KEYS = ['sample.samplingPoint.notation', 'sample.sampledMaterialType.label', "month", "yr", "Date", "lat", "lon"]
+
+
+def _key_codes(df, keys):
+	"""
+	Return the integer code of each row's key combination (in the sorted order of the keys, -1 where a key is missing)
+	and the row of the first occurrence of each code.
+	"""
+	code = np.zeros(len(df), dtype=np.int64)
+	missing = np.zeros(len(df), dtype=bool)
+	for key in keys:
+		codes, uniques = pd.factorize(df[key], sort=True)
+		missing |= codes < 0
+		if (int(code.max(initial=0)) + 1) * (len(uniques) + 1) >= 2**62:
+			code = np.unique(code, return_inverse=True)[1].astype(np.int64)
+		code = code * len(uniques) + codes
+	code[missing] = -1
+	uniques, first, code = np.unique(code, return_index=True, return_inverse=True)
+	if len(uniques) and uniques[0] == -1:
+		return code - 1, first[1:]
+	return code, first
+
+
+@profiled
+def pivot_determinands(df, keys=PIVOT_KEYS, columns='determinand.definition', values="result", sparse=False):
+	"""
+	Return the (sample x determinand) matrix of the results, as df.pivot_table(values, keys, columns) with the default mean,
+	built from integer codes of the keys instead of a multi-index of objects.
+	Each row is a sample (a distinct combination of keys), each column a determinand; the sample metadata is returned
+	as a separate frame aligned with the rows, ready for the imputation, PCA and t-SNE steps.
+
+	input:
+	df (DataFrame object): e.g. a subset from loc_subset, with the key columns
+	keys (list of str): the columns identifying a sample, default the notation, material, month, yr, Date, lat and lon of the notebooks
+	columns (str): the column of the determinands, e.g. 'determinand.definition' or 'determinand.notation'
+	values (str): the column of the results
+	sparse (bool): False (dense float32 ndarray, NaN where a determinand was not measured); True (scipy.sparse.csr_matrix of the measured entries only)
+
+	output:
+	matrix (ndarray or csr_matrix), samples (DataFrame object): the key columns, one row per matrix row, sorted by the keys, determinands (Index object): one per matrix column, sorted
+
+	.. warning::
+	Rows with a missing key, determinand or result are dropped before the samples and determinands are coded, as in pivot_table:
+	every row and column of the matrix has at least one measured value, and the matrix, samples and determinands are those of
+	pivot_table (same rows, columns and means, up to float32 rounding).
+	sparse=True requires scipy; a measured 0 is stored explicitly, so missing entries stay distinguishable from zeros.
+	"""
+	if "Date" in keys and "Date" not in df.columns:
+		df = df.assign(Date=_sample_day(df))
+	value = df[values].to_numpy(dtype=np.float64, na_value=np.nan)
+	keep = np.flatnonzero(~np.isnan(value) & df[columns].notna().to_numpy() & df[keys].notna().all(axis=1).to_numpy())
+	df = df.iloc[keep, df.columns.get_indexer(list(keys) + [columns])]
+	value = value[keep]
+
+	sample, first = _key_codes(df, keys)
+	determinand, determinands = pd.factorize(df[columns], sort=True)
+	samples = df[keys].iloc[first].reset_index(drop=True)
+	shape = (len(first), len(determinands))
+
+	cell, entry = np.unique(sample * shape[1] + determinand, return_inverse=True)
+	mean = (np.bincount(entry, weights=value, minlength=len(cell)) / np.bincount(entry, minlength=len(cell))).astype(np.float32)
+
+	if sparse:
+		from scipy.sparse import csr_matrix
+		matrix = csr_matrix((mean, (cell // shape[1], cell % shape[1])), shape=shape, dtype=np.float32)
+	else:
+		matrix = np.full(shape, np.nan, dtype=np.float32)
+		matrix.ravel()[cell] = mean
+	return(matrix, samples, pd.Index(determinands, name=columns))
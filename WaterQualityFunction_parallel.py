@@ -0,0 +1,250 @@
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import numpy as np
+
+import WaterQualityFunction_nutrient as wqfn
+import WaterQualityFunction_determinand as wqfd
+from WaterQualityFunction_index import SamplingPointIndex, _concatenate_ranges
+
+
+_shared_indices = {}
+
+MIN_PARALLEL_ROWS = 10**6
+
+
+def _set_shared(key, index):
+	_shared_indices[key] = index
+
+
+def _balanced_split(items, rows, n_partitions):
+	"""
+	Split a list of items into at most n_partitions runs of contiguous items with about the same total number of rows.
+	"""
+	if len(items) == 0:
+		return []
+	rows = np.cumsum(rows)
+	bounds = np.unique(np.searchsorted(rows, rows[-1] * np.arange(1, n_partitions) / n_partitions, side="right"))
+	bounds = np.concatenate([[0], bounds[(bounds > 0) & (bounds < len(items))], [len(items)]])
+	return [items[start:stop] for start, stop in zip(bounds[:-1], bounds[1:])]
+
+
+def _partition(index, blocks, n_partitions):
+	"""
+	Split sampling-point blocks into at most n_partitions groups of contiguous blocks with about the same number of rows.
+	"""
+	return _balanced_split(blocks, index.stops[blocks] - index.starts[blocks], n_partitions)
+
+
+def _partition_frame(index, blocks):
+	return index.df.iloc[_concatenate_ranges(index.starts[blocks], index.stops[blocks])]
+
+
+def _worker(task):
+	key, kind, blocks, args = task
+	index = _shared_indices[key]
+	df_part = _partition_frame(index, blocks) if kind != "sites" else None
+
+	if kind == "nutrient":
+		determinands, = args
+		return [wqfn.nutrient_time(df_part, "", determinand, "label") for determinand in determinands]
+	if kind == "nutrient_seasons":
+		determinands, season_months = args
+		return [wqfn.nutrient_time_seasons(df_part, "", determinand, "label", season_months) for determinand in determinands]
+	if kind == "DAIN":
+		return wqfn.DAIN_time(df_part, "", "label")
+	if kind == "DAIN_seasons":
+		season_months, = args
+		return wqfn.DAIN_time_seasons(df_part, "", "label", season_months)
+	if kind == "sites":
+		function, function_args = args
+		results = []
+		for site_blocks in blocks:
+			df_site = _partition_frame(index, site_blocks)
+			results.append((df_site['sample.samplingPoint.notation'].iloc[0], function(df_site, *function_args)))
+		return results
+	raise ValueError("unknown task %s" % kind)
+
+
+def _merge_series(parts, dtype):
+	"""
+	Merge the (time, value) series of several partitions into one series in date order. The merge is stable and the
+	partitions are in sampling-point order, so samples of the same day keep the order of the serial functions (see
+	WaterQualityFunction_query._date_order); the values keep the row labels of the frame, as in the serial Series.
+	"""
+	if len(parts) == 0:
+		return(np.empty(0, dtype="datetime64[ns]"), pd.Series([], dtype=dtype, name="result"))
+	time = np.concatenate([np.asarray(time_, dtype="datetime64[ns]") for time_, _ in parts])
+	value = pd.concat([value_ for _, value_ in parts])
+	order = np.argsort(time, kind="stable")
+	return(time[order], value.iloc[order])
+
+
+def _series_output(series, date_format):
+	"""
+	Return merged series of one or more determinands in the shapes of nutrient_time: (time Series, result Series) for a
+	single determinand, concatenated arrays for several.
+	"""
+	if len(series)>1:
+		return(wqfn.format_dates(np.concatenate([time for time, _ in series]), date_format), np.concatenate([value for _, value in series]))
+	time, value = series[0]
+	return(wqfn.format_dates(pd.Series(time, index=value.index, name="Date"), date_format), value)
+
+
+def _sum_by_date(parts, dtype):
+	"""
+	Merge the (date, dain) series of several partitions, summing the DAIN of the same date across partitions,
+	in the shapes of DAIN_pairs: (date Series, dain Series).
+	"""
+	dain = pd.concat([pd.Series(np.asarray(dain_), index=pd.DatetimeIndex(date_, name="Date")) for date_, dain_ in parts]) if parts else pd.Series([], dtype=dtype, index=pd.DatetimeIndex([], name="Date"))
+	dain = dain.groupby(level=0, sort=True).sum().astype(dtype, copy=False).rename("result").reset_index()
+	return(dain["Date"], dain["result"])
+
+
+class ParallelBackend:
+	"""
+	Execution backend running the nutrient extraction over partitions of the dataset by sampling point, in a pool of processes.
+	The frame is indexed once by sampling point (SamplingPointIndex); each query splits the matching sampling points into
+	balanced partitions, the workers extract and aggregate their partitions, and the results are merged into the return
+	shapes of WaterQualityFunction_nutrient.
+
+	input:
+	df (DataFrame object or SamplingPointIndex)
+	processes (int, optional): number of worker processes, default os.cpu_count(); 1 computes in the calling process
+	min_rows (int, optional): queries matching fewer rows call the serial functions of WaterQualityFunction_nutrient on the index
+	instead (and site_map runs in the calling process); default MIN_PARALLEL_ROWS, 0 always uses the workers
+
+	Example:
+	with ParallelBackend(df) as backend:
+		time, nitrite = backend.nutrient_time("langstone", 118)
+		series = backend.site_map(wqfn.DAIN_time, notations)
+
+	.. warning::
+	On Linux the workers are forked and read the indexed frame from the parent's memory (copy-on-write); with other
+	start methods the index is pickled to each worker once. Frames returned by the workers are pickled back: ask for
+	series, not subsets.
+
+	.. warning::
+	Each parallel query pays a fixed cost (partitioning, dispatch to the pool, pickling of the series and merge) that the
+	serial functions do not: the workers only pay off on large queries and with as many idle cores as processes.
+	"""
+
+	def __init__(self, df, processes=None, min_rows=MIN_PARALLEL_ROWS):
+		self.index = df if isinstance(df, SamplingPointIndex) else SamplingPointIndex(df)
+		self.processes = processes or os.cpu_count()
+		self.min_rows = min_rows
+		self.key = id(self)
+		self.executor = None
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
+
+	def close(self):
+		if self.executor is not None:
+			self.executor.shutdown()
+			self.executor = None
+		_shared_indices.pop(self.key, None)
+
+	def _map(self, kind, partitions, args, serial=False):
+		tasks = [(self.key, kind, blocks, args) for blocks in partitions]
+		_set_shared(self.key, self.index)
+		if serial or self.processes == 1 or len(tasks) <= 1:
+			return [_worker(task) for task in tasks]
+		if self.executor is None:
+			if "fork" in multiprocessing.get_all_start_methods():
+				self.executor = ProcessPoolExecutor(max_workers=self.processes, mp_context=multiprocessing.get_context("fork"))
+			else:
+				self.executor = ProcessPoolExecutor(max_workers=self.processes, initializer=_set_shared, initargs=(self.key, self.index))
+		return list(self.executor.map(_worker, tasks))
+
+	def partitions(self, location, location_type="label"):
+		"""
+		Return the partitions of the sampling-point blocks matching a location, one per worker at most.
+		"""
+		return _partition(self.index, self.index.blocks(location, location_type), self.processes)
+
+	def serial(self, location, location_type="label"):
+		"""
+		Return True if a query of a location is computed by the serial functions: one process, or fewer rows than min_rows.
+		"""
+		if self.processes == 1:
+			return True
+		blocks = self.index.blocks(location, location_type)
+		return int(np.sum(self.index.stops[blocks] - self.index.starts[blocks])) < self.min_rows
+
+	def loc_subset(self, location, location_type="label"):
+		return self.index.subset(location, location_type)
+
+	def nutrient_time(self, location, nutrient_determinand, location_type="label", date_format="datetime64"):
+		"""
+		Return nutrient VS time for a given location, as WaterQualityFunction_nutrient.nutrient_time (same order and types).
+		"""
+		if self.serial(location, location_type):
+			return wqfn.nutrient_time(self.index, location, nutrient_determinand, location_type, date_format)
+		determinands = list(np.atleast_1d(wqfd.codes(nutrient_determinand)))
+		results = self._map("nutrient", self.partitions(location, location_type), (determinands,))
+		dtype = self.index.df["result"].dtype
+		return _series_output([_merge_series([result[i] for result in results], dtype) for i in range(len(determinands))], date_format)
+
+	def nutrient_time_seasons(self, location, nutrient_determinand, location_type="label", season_months=wqfn.SEASON_MONTHS, date_format="datetime64"):
+		"""
+		Return nutrient VS time for a given location divided into summer and winter, as WaterQualityFunction_nutrient.nutrient_time_seasons.
+		"""
+		if self.serial(location, location_type):
+			return wqfn.nutrient_time_seasons(self.index, location, nutrient_determinand, location_type, season_months, date_format)
+		determinands = list(np.atleast_1d(wqfd.codes(nutrient_determinand)))
+		results = self._map("nutrient_seasons", self.partitions(location, location_type), (determinands, season_months))
+		dtype = self.index.df["result"].dtype
+		output = ()
+		for season in (0, 2):
+			output += _series_output([_merge_series([result[i][season:season + 2] for result in results], dtype) for i in range(len(determinands))], date_format)
+		return output
+
+	def DAIN_time(self, location, location_type="label", date_format="datetime64"):
+		"""
+		Return the DAIN VS time of a location, as WaterQualityFunction_nutrient.DAIN_time (dain, date). The sums of a date
+		are added partition by partition, so they equal the serial ones up to floating-point rounding.
+		"""
+		if self.serial(location, location_type):
+			return wqfn.DAIN_time(self.index, location, location_type, date_format)
+		results = self._map("DAIN", self.partitions(location, location_type), ())
+		date_, dain_ = _sum_by_date([(date, dain) for dain, date in results], self.index.df["result"].dtype)
+		return(dain_, wqfn.format_dates(date_, date_format))
+
+	def DAIN_time_seasons(self, location, location_type="label", season_months=wqfn.SEASON_MONTHS, date_format="datetime64"):
+		"""
+		Return the DAIN VS time of a location divided into summer and winter, as WaterQualityFunction_nutrient.DAIN_time_seasons
+		(sums equal up to floating-point rounding, see DAIN_time).
+		"""
+		if self.serial(location, location_type):
+			return wqfn.DAIN_time_seasons(self.index, location, location_type, season_months, date_format)
+		results = self._map("DAIN_seasons", self.partitions(location, location_type), (season_months,))
+		output = []
+		for season in (0, 2):
+			date_, dain_ = _sum_by_date([result[season:season + 2] for result in results], self.index.df["result"].dtype)
+			output += [wqfn.format_dates(date_, date_format), dain_]
+		return tuple(output)
+
+	def site_map(self, function, notations=None, *args):
+		"""
+		Apply a per-site function to the rows of each sampling point, in parallel, e.g. site_map(wqfn.DAIN_time, notations, "").
+
+		input:
+		function (callable): function(df_site, *args), a module-level function (it is pickled to the workers unless forked)
+		notations (list of str, optional): the sampling points, matched as in loc_subset(..., "notation"); None for all
+
+		output:
+		results (dict): notation -> result of function
+		"""
+		blocks = self.index.blocks("" if notations is None else notations, "notation")
+		block_notations = self.index.tokens["notation"].to_numpy()[blocks]
+		change = np.flatnonzero(block_notations[1:] != block_notations[:-1]) + 1
+		sites = np.split(blocks, change) if len(blocks) else []
+		rows = [np.sum(self.index.stops[site] - self.index.starts[site]) for site in sites]
+		results = self._map("sites", _balanced_split(sites, rows, 4 * self.processes), (function, args), sum(rows) < self.min_rows)
+		return dict(pair for result in results for pair in result)
@@ -3,9 +3,121 @@ import matplotlib.pyplot as plt
 import numpy as np
 
 import WaterQualityFunction_nutrient as wqfn
+from WaterQualityFunction_profile import profiled
+
+
+def decimate_minmax(time, value, n_buckets):
+	"""
+	Return a decimated copy of a time series that keeps its visual envelope: the time axis is divided into n_buckets
+	equal buckets (e.g. one per pixel) and only the first, last, minimum and maximum points of each bucket are kept, in their original order.
+
+	input:
+	time (array): datetime64, float or datetime.date values
+	value (array)
+	n_buckets (int): number of buckets, e.g. the width of the axis in pixels
+
+	output:
+	time (ndarray), value (ndarray)
+	"""
+	time = np.asarray(time)
+	value = np.asarray(value, dtype=float)
+	finite = np.flatnonzero(~np.isnan(value))
+	if len(finite) <= 4 * n_buckets:
+		return(time, value)
+
+	x = time[finite]
+	x = x.astype("datetime64[ns]").view(np.int64) if x.dtype.kind in "OM" else x.astype(float)
+	span = x.max() - x.min()
+	bucket = np.zeros(len(x), dtype=np.int64) if span == 0 else np.minimum(((x - x.min()) / span * n_buckets).astype(np.int64), n_buckets - 1)
+
+	by_value = np.lexsort((value[finite], bucket))
+	group_start = np.flatnonzero(np.diff(bucket[by_value], prepend=-1))
+	group_stop = np.append(group_start[1:], len(by_value)) - 1
+	first = np.unique(bucket, return_index=True)[1]
+	last = len(bucket) - 1 - np.unique(bucket[::-1], return_index=True)[1]
+
+	keep = finite[np.unique(np.concatenate([first, last, by_value[group_start], by_value[group_stop]]))]
+	return(time[keep], value[keep])
+
+
+@profiled
+def _decimate(ax, time, value, decimate):
+	"""
+	Return the series to draw: unchanged if decimate is None, else decimated to decimate buckets (True: one bucket per pixel of the axis).
+	"""
+	if decimate is None or decimate is False:
+		return(time, value)
+	if decimate is True:
+		decimate = max(1, int(ax.get_window_extent().width))
+	return decimate_minmax(time, value, decimate)
 	
 
-def plot_location_nutrientVStime(df, location, nutrient_determinand, ax=None, location_type="label"):
+def location_series(df, location, nutrient_determinand=None, location_type="label", season=None, censoring="raw"):
+	"""
+	Return the (time, value) series a plot function draws: the nutrient VS time of a location, or its DAIN if no determinand is given,
+	for the whole year or one season.
+
+	input:
+	df (DataFrame object)
+	location (str or list of str): the location(s) of interest, e.g. "langstone"; empty string "" return entire catalogue
+	nutrient_determinand (int, list of int or str, optional): e.g. 118, [9993, 111, 119] or "ammonia"; None for the DAIN
+	location_type (str): either "label" (e.g. "langstone", "portsmouth") or "notation" (e.g. "SO-G00", "SW-Z94")
+	season (str, optional): None (whole year), "summer" or "winter"
+	censoring (str): results below the limit of detection, "raw", "half" or "exclude", see WaterQualityFunction_nutrient.censor
+
+	output:
+	time, value
+	"""
+	if nutrient_determinand is None:
+		if season is None:
+			value, time = wqfn.DAIN_time(df, location, location_type, censoring=censoring)[:2]
+			return(time, value)
+		series = wqfn.DAIN_time_seasons(df, location, location_type, censoring=censoring)
+	else:
+		if season is None:
+			return wqfn.nutrient_time(df, location, nutrient_determinand, location_type, censoring=censoring)[:2]
+		series = wqfn.nutrient_time_seasons(df, location, nutrient_determinand, location_type, censoring=censoring)
+	winter = len(series) // 2
+	return series[0:2] if season == "summer" else series[winter:winter + 2]
+
+
+def draw_series(ax, time, value, plt_kwargs={}, sct_kwargs={}, xlabel=None, ylabel=None, label_str=None, plot_title=None, title_fontsize=18, decimate=None):
+	"""
+	Draw a (time, value) series on an axis as the customizable plot functions do: a line under a scatter, then the labels,
+	the legend (if label_str is given) and the title. The series can be computed elsewhere, e.g. in the workers of
+	WaterQualityFunction_report.
+
+	input:
+	ax (Axes object)
+	time, value (array)
+	plt_kwargs (properties, optional): to specify properties of the plot
+	sct_kwargs (properties, optional): to specify properties of the scatter plot
+	xlabel, ylabel (str): labels of the axes
+	label_str (str): label of the series in the legend
+	plot_title (str): title of the axis
+	title_fontsize (int): font size of the title
+	decimate (int or bool, optional): draw at most the first, last, min and max point of each of decimate time buckets; True for one bucket per pixel of the axis
+
+	output:
+	ax (Axes object)
+	"""
+	time, value = _decimate(ax, time, value, decimate)
+	ax.plot(time, value, zorder=1, **plt_kwargs)
+	ax.scatter(time, value, zorder=2, **sct_kwargs, label=label_str)
+
+	if ylabel != None:
+		ax.set_ylabel(str(ylabel))
+	if xlabel != None:
+		ax.set_xlabel(str(xlabel))
+	if label_str != None:
+		ax.legend(fontsize=18)
+	if plot_title != None:
+		ax.set_title(label=str(plot_title), fontsize=title_fontsize)
+	return(ax)
+
+
+@profiled
+def plot_location_nutrientVStime(df, location, nutrient_determinand, ax=None, location_type="label", decimate=None):
 	
 	"""
 	Return a plot nutrient VS time for a given location, diveded or not into winter (oct-march) and summer (apr-sept).
@@ -16,6 +128,7 @@ def plot_location_nutrientVStime(df, location, nutrient_determinand, ax=None, lo
 	nutrient_determinand (int): the determinant of the nutrient, e.g. 118 for Nitrite (N), mg/l
 	ax(Axes object)
 	location_type (str): either "label" (e.g. "langstone", "portsmouth") or "notation" (e.g. "SO-G00", "SW-Z94")
+	decimate (int or bool, optional): draw at most the first, last, min and max point of each of decimate time buckets; True for one bucket per pixel of the axis
 	
 	output:
 	ax (Axes object)
@@ -23,12 +136,14 @@ def plot_location_nutrientVStime(df, location, nutrient_determinand, ax=None, lo
 	if ax is None:
 		ax = plt.gca()
 	time, nutrient = wqfn.nutrient_time(df, location, nutrient_determinand, location_type)
+	time, nutrient = _decimate(ax, time, nutrient, decimate)
 	ax.plot(time,nutrient,color='teal', zorder=1,linewidth=2)
 	ax.scatter(time,nutrient,edgecolor="black", facecolor="white", linewidth=2, zorder=2, s=20)
 	return(ax)
 	
 	
-def plot_location_nutrientVStime_seasons(df, location, nutrient_determinand, ax=None, location_type="label"):
+@profiled
+def plot_location_nutrientVStime_seasons(df, location, nutrient_determinand, ax=None, location_type="label", decimate=None):
 	
 	"""
 	Return a plot nutrient VS time for a given location, diveded or not into winter (oct-march) and summer (apr-sept).
@@ -39,6 +154,7 @@ def plot_location_nutrientVStime_seasons(df, location, nutrient_determinand, ax=
 	nutrient_determinand (int): the determinant of the nutrient, e.g. 118 for Nitrite (N), mg/l
 	ax(Axes object)
 	location_type (str): either "label" (e.g. "langstone", "portsmouth") or "notation" (e.g. "SO-G00", "SW-Z94")
+	decimate (int or bool, optional): draw at most the first, last, min and max point of each of decimate time buckets; True for one bucket per pixel of the axis
 	
 	output:
 	ax (Axes object)
@@ -50,10 +166,12 @@ def plot_location_nutrientVStime_seasons(df, location, nutrient_determinand, ax=
 
 	if ax is None:
 		ax = plt.gca()  
+	time_summer, nutrient_summer = _decimate(ax, time_summer, nutrient_summer, decimate)
 	ax.plot(time_summer, nutrient_summer,zorder=1, linewidth = 2, color='#EE6A50', linestyle=':')
 		
 	ax.scatter(time_summer, nutrient_summer,zorder=2, label="summer", color='orange', marker="+", s=30)
 
+	time_winter, nutrient_winter = _decimate(ax, time_winter, nutrient_winter, decimate)
 	ax.plot(time_winter, nutrient_winter,zorder=1, linewidth = 2, color='teal', linestyle='--')
 		
 	ax.scatter(time_winter, nutrient_winter,zorder=2, label="winter", color='blue', marker='o', s=20)
@@ -62,7 +180,8 @@ def plot_location_nutrientVStime_seasons(df, location, nutrient_determinand, ax=
 
 	return(ax)
 
-def plot_location_nutrientVStime_customizable(df, location, nutrient_determinand, ax=None, location_type="label", plt_kwargs={}, sct_kwargs={}, ylabel=None, plot_title=None):
+@profiled
+def plot_location_nutrientVStime_customizable(df, location, nutrient_determinand, ax=None, location_type="label", plt_kwargs={}, sct_kwargs={}, ylabel=None, plot_title=None, decimate=None):
 	"""
 	Return a plot nutrient VS time for a given location, diveded or not into winter (oct-march) and summer (apr-sept).
 	The plot is customizable.
@@ -81,6 +200,7 @@ def plot_location_nutrientVStime_customizable(df, location, nutrient_determinand
 	plt_kwargs_w (properties, optional): to specify properties of the plot, for winter data
 	sct_kwargs_w (properties, optional): to specify properties of the scatter plot, for winter data
 	ylabel (str): label for the y-axis
+	decimate (int or bool, optional): draw at most the first, last, min and max point of each of decimate time buckets; True for one bucket per pixel of the axis
 	
 	output:
 	ax (Axes object)
@@ -89,6 +209,7 @@ def plot_location_nutrientVStime_customizable(df, location, nutrient_determinand
 
 	if ax is None:
 		ax = plt.gca()
+	time, nutrient = _decimate(ax, time, nutrient, decimate)
 	ax.plot(time,nutrient, zorder=1, **plt_kwargs)
 	ax.scatter(time,nutrient, zorder=2, **sct_kwargs)
 
@@ -97,7 +218,8 @@ def plot_location_nutrientVStime_customizable(df, location, nutrient_determinand
 		ax.set_ylabel(str(ylabel))
 	return(ax)
 	
-def plot_location_nutrientVStime_customizable_seasons(df, location, nutrient_determinand, ax=None, location_type="label", plt_kwargs_s={}, sct_kwargs_s={}, plt_kwargs_w={}, sct_kwargs_w={}, ylabel=None, plot_title=None):
+@profiled
+def plot_location_nutrientVStime_customizable_seasons(df, location, nutrient_determinand, ax=None, location_type="label", plt_kwargs_s={}, sct_kwargs_s={}, plt_kwargs_w={}, sct_kwargs_w={}, ylabel=None, plot_title=None, decimate=None):
 	"""
 	Return a plot nutrient VS time for a given location, diveded or not into winter (oct-march) and summer (apr-sept).
 	The plot is customizable.
@@ -116,16 +238,19 @@ def plot_location_nutrientVStime_customizable_seasons(df, location, nutrient_det
 	plt_kwargs_w (properties, optional): to specify properties of the plot, for winter data
 	sct_kwargs_w (properties, optional): to specify properties of the scatter plot, for winter data
 	ylabel (str): label for the y-axis
+	decimate (int or bool, optional): draw at most the first, last, min and max point of each of decimate time buckets; True for one bucket per pixel of the axis
 	
 	output:
 	ax (Axes object)
 	"""
-	time_summer, nutrient_summer, time_winter, nutrient_winter = wqfn.nutrient_time(df, location, nutrient_determinand, location_type)
+	time_summer, nutrient_summer, time_winter, nutrient_winter = wqfn.nutrient_time_seasons(df, location, nutrient_determinand, location_type)
 
 	if ax is None:
 		ax = plt.gca()  
+	time_summer, nutrient_summer = _decimate(ax, time_summer, nutrient_summer, decimate)
 	ax.plot(time_summer,nutrient_summer,zorder=1,**plt_kwargs_s)
 	ax.scatter(time_summer,nutrient_summer,zorder=2, label="summer", **sct_kwargs_s)
+	time_winter, nutrient_winter = _decimate(ax, time_winter, nutrient_winter, decimate)
 	ax.plot(time_winter, nutrient_winter,zorder=1, **plt_kwargs_w)
 	ax.scatter(time_winter, nutrient_winter,zorder=2, label="winter",**sct_kwargs_w)
 	if ylabel != None:
@@ -138,7 +263,8 @@ def plot_location_nutrientVStime_customizable_seasons(df, location, nutrient_det
 	
 
 	
-def plot_location_nutrientVStime_customizable_summer(df, location, nutrient_determinand, ax=None, location_type="label", plt_kwargs_s={}, sct_kwargs_s={}, xlabel= None, ylabel=None, label_str=None, plot_title=None):
+@profiled
+def plot_location_nutrientVStime_customizable_summer(df, location, nutrient_determinand, ax=None, location_type="label", plt_kwargs_s={}, sct_kwargs_s={}, xlabel= None, ylabel=None, label_str=None, plot_title=None, decimate=None):
 	"""
 	Return a plot nutrient VS time for a given location, diveded or not into winter (oct-march) and summer (apr-sept).
 	The plot is customizable.
@@ -157,31 +283,19 @@ def plot_location_nutrientVStime_customizable_summer(df, location, nutrient_dete
 	plt_kwargs_w (properties, optional): to specify properties of the plot, for winter data
 	sct_kwargs_w (properties, optional): to specify properties of the scatter plot, for winter data
 	ylabel (str): label for the y-axis
+	decimate (int or bool, optional): draw at most the first, last, min and max point of each of decimate time buckets; True for one bucket per pixel of the axis
 	
 	output:
 	ax (Axes object)
 	"""
-	time_summer = wqfn.nutrient_time_seasons(df, location, nutrient_determinand, location_type)[0]
-	nutrient_summer = wqfn.nutrient_time_seasons(df, location, nutrient_determinand, location_type)[1]
-
+	time_summer, nutrient_summer = location_series(df, location, nutrient_determinand, location_type, "summer")
 
 	if ax is None:
 		ax = plt.gca()  
-	ax.plot(time_summer, nutrient_summer,zorder=1,**plt_kwargs_s)
-	ax.scatter(time_summer, nutrient_summer,zorder=2, **sct_kwargs_s,  label=label_str)
-
-
-	if ylabel != None:
-		ax.set_ylabel(str(ylabel))
-	if xlabel != None:
-		ax.set_xlabel(str(xlabel))
-	if label_str != None:
-		ax.legend(fontsize=18)
-	if plot_title != None:
-		ax.set_title(label=str(plot_title), fontsize=18)
-	return(ax)
+	return draw_series(ax, time_summer, nutrient_summer, plt_kwargs_s, sct_kwargs_s, xlabel, ylabel, label_str, plot_title, decimate=decimate)
 	
-def plot_location_nutrientVStime_customizable_winter(df, location, nutrient_determinand, ax=None, location_type="label", plt_kwargs_w={}, sct_kwargs_w={}, xlabel = None, ylabel=None, label_str=None, plot_title=None):
+@profiled
+def plot_location_nutrientVStime_customizable_winter(df, location, nutrient_determinand, ax=None, location_type="label", plt_kwargs_w={}, sct_kwargs_w={}, xlabel = None, ylabel=None, label_str=None, plot_title=None, decimate=None):
 	"""
 	Return a plot nutrient VS time for a given location, diveded or not into winter (oct-march) and summer (apr-sept).
 	The plot is customizable.
@@ -200,35 +314,25 @@ def plot_location_nutrientVStime_customizable_winter(df, location, nutrient_dete
 	plt_kwargs_w (properties, optional): to specify properties of the plot, for winter data
 	sct_kwargs_w (properties, optional): to specify properties of the scatter plot, for winter data
 	ylabel (str): label for the y-axis
+	decimate (int or bool, optional): draw at most the first, last, min and max point of each of decimate time buckets; True for one bucket per pixel of the axis
 	
 	output:
 	ax (Axes object)
 	"""
-	time_winter = wqfn.nutrient_time_seasons(df, location, nutrient_determinand, location_type)[2]
-	nutrient_winter = wqfn.nutrient_time_seasons(df, location, nutrient_determinand, location_type)[3]
+	time_winter, nutrient_winter = location_series(df, location, nutrient_determinand, location_type, "winter")
 
 	if ax is None:
 		ax = plt.gca()  
-	ax.plot(time_winter, nutrient_winter,zorder=1, **plt_kwargs_w)
-	ax.scatter(time_winter, nutrient_winter,zorder=2, **sct_kwargs_w, label=label_str)
-
-
-	if ylabel != None:
-		ax.set_ylabel(str(ylabel))
-	if xlabel != None:
-		ax.set_xlabel(str(xlabel))
-	if label_str != None:
-		ax.legend(fontsize=18)
-	if plot_title != None:
-		ax.set_title(label=str(plot_title), fontsize=18)
-	return(ax)
+	return draw_series(ax, time_winter, nutrient_winter, plt_kwargs_w, sct_kwargs_w, xlabel, ylabel, label_str, plot_title, decimate=decimate)
 
-def DAIN(df, location, ax=None, location_type="label", plt_kwargs={}, sct_kwargs={}, xlabel=None, ylabel=None, plot_title=None, label_str=None):
+@profiled
+def DAIN(df, location, ax=None, location_type="label", plt_kwargs={}, sct_kwargs={}, xlabel=None, ylabel=None, plot_title=None, label_str=None, decimate=None):
 
 	dain_, date_ = wqfn.DAIN_time(df, location, location_type)
 
 	if ax is None:
 		ax = plt.gca()
+	date_, dain_ = _decimate(ax, date_, dain_, decimate)
 	ax.scatter(date_, dain_, zorder=2, **sct_kwargs)
 	if ylabel != None:
 		ax.set_ylabel(str(ylabel))
@@ -241,14 +345,17 @@ def DAIN(df, location, ax=None, location_type="label", plt_kwargs={}, sct_kwargs
 		
 	return(ax)
 	
-def DAIN_seasons(df, location, ax=None, location_type="label", plt_kwargs_s={}, sct_kwargs_s={}, plt_kwargs_w={}, sct_kwargs_w={}, xlabel=None, ylabel=None, plot_title=None, label_str=None):
+@profiled
+def DAIN_seasons(df, location, ax=None, location_type="label", plt_kwargs_s={}, sct_kwargs_s={}, plt_kwargs_w={}, sct_kwargs_w={}, xlabel=None, ylabel=None, plot_title=None, label_str=None, decimate=None):
 
 	date_summer, dain_summer, date_winter, dain_winter = wqfn.DAIN_time_seasons(df, location, location_type)
 		
 	if ax is None:
 		ax = plt.gca()		
+	date_summer, dain_summer = _decimate(ax, date_summer, dain_summer, decimate)
 	ax.scatter(date_summer, dain_summer, zorder=2, **sct_kwargs_s, label="summer")
-	ax.plot(date_summer, date_summer, zorder=1, **plt_kwargs_s)
+	ax.plot(date_summer, dain_summer, zorder=1, **plt_kwargs_s)
+	date_winter, dain_winter = _decimate(ax, date_winter, dain_winter, decimate)
 	ax.scatter(date_winter, dain_winter, zorder=2, **sct_kwargs_w, label="winter")
 	ax.plot(date_winter, dain_winter, zorder=1, **plt_kwargs_w)
 
@@ -265,50 +372,18 @@ def DAIN_seasons(df, location, ax=None, location_type="label", plt_kwargs_s={},
 	
 	
 	
-def DAIN_summer(df, location, ax=None, location_type="label", plt_kwargs={}, sct_kwargs={},plt_kwargs_s={}, sct_kwargs_s={}, xlabel=None, ylabel=None, plot_title=None, label_str=None):
-	date_summer = wqfn.DAIN_time_seasons(df, location, location_type)[0]
-	dain_summer = wqfn.DAIN_time_seasons(df, location, location_type)[1]
+@profiled
+def DAIN_summer(df, location, ax=None, location_type="label", plt_kwargs={}, sct_kwargs={},plt_kwargs_s={}, sct_kwargs_s={}, xlabel=None, ylabel=None, plot_title=None, label_str=None, decimate=None):
+	date_summer, dain_summer = location_series(df, location, None, location_type, "summer")
 
 	if ax is None:
 		ax = plt.gca()		
-	ax.scatter(date_summer, dain_summer, zorder=2, **sct_kwargs_s, label=label_str)
-	ax.plot(date_summer, dain_summer, zorder=1, **plt_kwargs_s)
-
-	if ylabel != None:
-		ax.set_ylabel(str(ylabel))
-	if xlabel != None:
-		ax.set_xlabel(str(xlabel))
-	if label_str != None:
-		ax.legend(fontsize=18)
-	if plot_title != None:
-		ax.set_title(label=str(plot_title), fontsize=22)
-	return(ax)
+	return draw_series(ax, date_summer, dain_summer, plt_kwargs_s, sct_kwargs_s, xlabel, ylabel, label_str, plot_title, title_fontsize=22, decimate=decimate)
 	
-def DAIN_winter(df, location, ax=None, location_type="label", plt_kwargs={}, sct_kwargs={}, plt_kwargs_w={}, sct_kwargs_w={}, xlabel=None, ylabel=None, plot_title=None, label_str=None):
-	date_winter = wqfn.DAIN_time_seasons(df, location, location_type)[2]
-	dain_winter = wqfn.DAIN_time_seasons(df, location, location_type)[3]
-		
+@profiled
+def DAIN_winter(df, location, ax=None, location_type="label", plt_kwargs={}, sct_kwargs={}, plt_kwargs_w={}, sct_kwargs_w={}, xlabel=None, ylabel=None, plot_title=None, label_str=None, decimate=None):
+	date_winter, dain_winter = location_series(df, location, None, location_type, "winter")
 
-	
 	if ax is None:
 		ax = plt.gca()		
-
-
-	ax.scatter(date_winter, dain_winter, zorder=2, **sct_kwargs_w, label=label_str)
-	ax.plot(date_winter, dain_winter, zorder=1, **plt_kwargs_w)
-
-
-
-	if ylabel != None:
-		ax.set_ylabel(str(ylabel))
-	if xlabel != None:
-		ax.set_xlabel(str(xlabel))
-	if label_str != None:
-		ax.legend(fontsize=18)
-	if plot_title != None:
-		ax.set_title(label=str(plot_title), fontsize=22)
-	return(ax)
-
-
-
-
+	return draw_series(ax, date_winter, dain_winter, plt_kwargs_w, sct_kwargs_w, xlabel, ylabel, label_str, plot_title, title_fontsize=22, decimate=decimate)
@@ -0,0 +1,194 @@
+import os
+import json
+import time
+import functools
+import threading
+import tracemalloc
+from contextlib import contextmanager
+
+import pandas as pd
+import numpy as np
+
+
+_enabled = False
+_memory = False
+_started_tracemalloc = False
+_records = []
+_memory_stack = []
+_origin = time.perf_counter()
+
+
+def enable_profiling(memory=False):
+	"""
+	Start recording the calls of the profiled functions of WaterQualityFunction_nutrient and WaterQualityFunction_plot:
+	wall time, rows in and out, and optionally the bytes allocated (peak traced by tracemalloc).
+
+	input:
+	memory (bool): also trace the allocations; tracemalloc slows every allocation down, so timings are inflated
+
+	.. warning::
+	Profiling is off by default; when off, a profiled function only pays for one flag check.
+	"""
+	global _enabled, _memory, _started_tracemalloc
+	_enabled = True
+	_memory = memory
+	if memory and not tracemalloc.is_tracing():
+		tracemalloc.start()
+		_started_tracemalloc = True
+
+
+def disable_profiling():
+	global _enabled, _memory, _started_tracemalloc
+	_enabled = False
+	_memory = False
+	if _started_tracemalloc:
+		tracemalloc.stop()
+		_started_tracemalloc = False
+	del _memory_stack[:]
+
+
+def reset_profiling():
+	global _origin
+	del _records[:]
+	_origin = time.perf_counter()
+
+
+@contextmanager
+def profiling(memory=False):
+	"""
+	Record the profiled calls of a block, e.g.
+
+	with wqfp.profiling():
+		wqfplot.DAIN_seasons(df, "langstone")
+	print(wqfp.profile_summary())
+	"""
+	enable_profiling(memory)
+	try:
+		yield _records
+	finally:
+		disable_profiling()
+
+
+def _rows(value):
+	"""
+	Return the number of rows of an argument or result: its length for frames and arrays, the number of positions of a
+	(frame, positions) pair as returned by Query.positions, the length of the first item of a tuple of series, the total
+	length of a dict of frames, the rows of the frame queried by a Query or indexed by a SamplingPointIndex (so that
+	rows_in of the Query stages is the size of their input); None for anything else (e.g. an Axes object or a PartitionedStore).
+	"""
+	if isinstance(value, (pd.DataFrame, pd.Series, np.ndarray)):
+		return len(value)
+	if isinstance(value, tuple) and len(value) == 2 and isinstance(value[0], pd.DataFrame) and isinstance(value[1], np.ndarray) and value[1].dtype.kind in "iu":
+		return len(value[1])
+	if isinstance(value, tuple) and len(value):
+		return _rows(value[0])
+	if isinstance(value, dict) and len(value):
+		rows = [_rows(item) for item in value.values()]
+		return None if None in rows else sum(rows)
+	if hasattr(value, "df"):
+		return _rows(value.df)
+	return None
+
+
+def _memory_enter():
+	current, peak = tracemalloc.get_traced_memory()
+	if _memory_stack:
+		_memory_stack[-1][1] = max(_memory_stack[-1][1], peak)
+	tracemalloc.reset_peak()
+	_memory_stack.append([current, current])
+
+
+def _memory_exit():
+	peak = tracemalloc.get_traced_memory()[1]
+	start, frame_peak = _memory_stack.pop()
+	frame_peak = max(frame_peak, peak)
+	if _memory_stack:
+		_memory_stack[-1][1] = max(_memory_stack[-1][1], frame_peak)
+	return frame_peak - start
+
+
+def profiled(function):
+	"""
+	Record the wall time, rows in (first argument) and out (result) and bytes allocated of each call of a function,
+	while profiling is enabled.
+	"""
+	name = "%s.%s" % (function.__module__, function.__name__)
+
+	@functools.wraps(function)
+	def wrapper(*args, **kwargs):
+		if not _enabled:
+			return function(*args, **kwargs)
+		memory = _memory and tracemalloc.is_tracing()
+		if memory:
+			_memory_enter()
+		start = time.perf_counter()
+		try:
+			result = function(*args, **kwargs)
+		finally:
+			seconds = time.perf_counter() - start
+			nbytes = _memory_exit() if memory else None
+		_records.append({
+			"function": name,
+			"start": start - _origin,
+			"seconds": seconds,
+			"rows_in": _rows(args[0]) if args else None,
+			"rows_out": _rows(result),
+			"bytes": nbytes,
+			"thread": threading.get_ident(),
+		})
+		return result
+	return wrapper
+
+
+def profile_records():
+	"""
+	Return the recorded calls as a frame, one row per call, in order of completion.
+	"""
+	return pd.DataFrame(_records, columns=["function", "start", "seconds", "rows_in", "rows_out", "bytes", "thread"])
+
+
+def profile_summary():
+	"""
+	Return the recorded calls aggregated per function, sorted by total time (inclusive of the profiled calls they make).
+
+	output:
+	summary (DataFrame object): columns calls, total_s, mean_s, max_s, rows_in, rows_out (means) and max_bytes, indexed by function
+	"""
+	records = profile_records()
+	summary = records.groupby("function").agg(
+		calls=("seconds", "size"),
+		total_s=("seconds", "sum"),
+		mean_s=("seconds", "mean"),
+		max_s=("seconds", "max"),
+		rows_in=("rows_in", "mean"),
+		rows_out=("rows_out", "mean"),
+		max_bytes=("bytes", "max"),
+	)
+	return summary.sort_values(by="total_s", ascending=False)
+
+
+def write_trace(path="profile_trace.json"):
+	"""
+	Write the recorded calls as a Chrome trace (chrome://tracing, Perfetto or speedscope), nested calls shown as a flame graph.
+
+	input:
+	path (str): output file
+
+	output:
+	path (str)
+	"""
+	events = []
+	for record in _records:
+		events.append({
+			"name": record["function"].rsplit(".", 1)[-1],
+			"cat": record["function"].rsplit(".", 1)[0],
+			"ph": "X",
+			"ts": record["start"] * 1e6,
+			"dur": record["seconds"] * 1e6,
+			"pid": os.getpid(),
+			"tid": record["thread"],
+			"args": {key: record[key] for key in ("rows_in", "rows_out", "bytes") if record[key] is not None},
+		})
+	with open(path, "w") as trace:
+		json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, trace)
+	return path
@@ -0,0 +1,460 @@
+import copy
+
+import pandas as pd
+import numpy as np
+
+from WaterQualityFunction_load import QUALIFIER_COLUMN, qualifier_codes
+from WaterQualityFunction_store import PartitionedStore
+from WaterQualityFunction_index import LOCATION_COLUMNS, SamplingPointIndex, match_places, time_blocks
+import WaterQualityFunction_determinand as wqfd
+from WaterQualityFunction_profile import profiled
+
+
+SEASON_MONTHS = {"summer": (5, 6, 7, 8), "winter": (1, 2, 3, 10, 11, 12)}
+
+SERIES_COLUMNS = ['sample.samplingPoint.notation', 'sample.samplingPoint.label', 'determinand.notation', 'sample.sampleDateTime', "Date", 'resultQualifier.notation', QUALIFIER_COLUMN, "result"]
+
+
+@profiled
+def _sample_day(df_env):
+	"""
+	Return the day of each sample as day-resolution datetime64: the "Date" column set by WaterQualityFunction_load.load_govdat,
+	else sample.sampleDateTime floored to the day (parsed only if it is still a string).
+	"""
+	if "Date" in df_env.columns and pd.api.types.is_datetime64_any_dtype(df_env["Date"]):
+		return df_env["Date"]
+	sample_time = df_env['sample.sampleDateTime']
+	if not pd.api.types.is_datetime64_any_dtype(sample_time):
+		sample_time = pd.to_datetime(sample_time)
+	return sample_time.dt.normalize().rename("Date")
+
+
+def _qualifier(df_env):
+	"""
+	Return the int8 result qualifier code of each row (see WaterQualityFunction_load.qualifier_codes): the column set at load,
+	else coded from 'resultQualifier.notation'. Raise ValueError if the frame has neither, e.g. loaded without them in usecols:
+	the results below the limit of detection cannot be told apart.
+	"""
+	if QUALIFIER_COLUMN in df_env.columns:
+		return df_env[QUALIFIER_COLUMN]
+	if 'resultQualifier.notation' in df_env.columns:
+		return pd.Series(qualifier_codes(df_env['resultQualifier.notation']), index=df_env.index, name=QUALIFIER_COLUMN)
+	raise ValueError("no result qualifier in the frame: load it with the %r or 'resultQualifier.notation' column to censor the results" % QUALIFIER_COLUMN)
+
+
+DERIVED_COLUMNS = {"Date": ('sample.sampleDateTime', _sample_day), QUALIFIER_COLUMN: ('resultQualifier.notation', _qualifier)}
+
+SITE_COLUMNS = [LOCATION_COLUMNS["notation"], LOCATION_COLUMNS["label"]]
+
+
+def _date_order(df_env, *keys):
+	"""
+	Return the positions sorting the rows by keys (first key first), then "Date", then sampling point (notation and label,
+	in the order of SamplingPointIndex), keeping the row order among the rest (stable): samples of several sampling points
+	on the same day come in the same order however the frame is ordered or partitioned (see WaterQualityFunction_parallel).
+	"""
+	sites = [pd.factorize(df_env[column], sort=True)[0] for column in reversed(SITE_COLUMNS)]
+	return np.lexsort(tuple(sites) + (df_env["Date"].to_numpy(),) + tuple(df_env[key].to_numpy() for key in reversed(keys)))
+
+
+def format_dates(time, date_format="datetime64"):
+	"""
+	Return sample days in the requested format. Days are datetime64 throughout the module; this is the only conversion.
+
+	input:
+	time (Series or ndarray): datetime64 days
+	date_format (str): "datetime64" (datetime64[ns] ndarray); "date" (Python datetime.date objects, as the notebooks used to get from .dt.date);
+	"epoch" (float ndarray of days since 1970-01-01, the matplotlib date numbers)
+
+	output:
+	time (Series or ndarray)
+	"""
+	if date_format == "date":
+		if isinstance(time, pd.Series):
+			return time.dt.date
+		return pd.DatetimeIndex(time).date
+	time = np.asarray(time, dtype="datetime64[ns]")
+	if date_format == "epoch":
+		return time.view(np.int64) / (86400 * 10**9)
+	return time
+
+
+@profiled
+def _sorted_time_series(df, blocks, location, nutrient_determinand, location_type="label", date_format="datetime64"):
+	"""
+	Return (time, nutrient) as nutrient_time does, slicing a frame returned by sort_by_time.
+	"""
+	time = []
+	nutrients = []
+	for n in np.atleast_1d(nutrient_determinand):
+		df_n = df.iloc[blocks.positions(location, n, location_type)]
+		time.append(_sample_day(df_n))
+		nutrients.append(df_n['result'])
+	if np.size(nutrient_determinand)>1:
+		return(format_dates(np.concatenate(time).flatten(), date_format), np.concatenate(nutrients).flatten())
+	return(format_dates(time[0], date_format), nutrients[0])
+
+
+def _gather(values, rows):
+	return values if rows is None else values[rows]
+
+
+def _contiguous(rows):
+	"""
+	Return the slice of rows if they are a run of consecutive positions, None otherwise.
+	"""
+	if len(rows) and rows[-1] - rows[0] + 1 == len(rows) and (len(rows) == 1 or np.all(np.diff(rows) == 1)):
+		return slice(int(rows[0]), int(rows[-1]) + 1)
+	return None
+
+
+def _take_columns(base, rows, columns):
+	"""
+	Return some rows (positions or a slice) and columns of a frame, computing the DERIVED_COLUMNS it does not have.
+	"""
+	present = [column for column in columns if column in base.columns]
+	derived = [column for column in columns if column not in base.columns and column in DERIVED_COLUMNS]
+	present += [DERIVED_COLUMNS[column][0] for column in derived if DERIVED_COLUMNS[column][0] in base.columns and DERIVED_COLUMNS[column][0] not in present]
+	df_subset = base.iloc[rows, base.columns.get_indexer(present)]
+	if derived:
+		df_subset = df_subset.assign(**{column: DERIVED_COLUMNS[column][1](df_subset) for column in derived})
+	return df_subset[columns]
+
+
+def project(df, columns=SERIES_COLUMNS):
+	"""
+	Return the frame narrowed to the columns the extraction functions read (sampling point, determinand, dates and result),
+	e.g. to keep only these in memory for a large report: the selected columns are shared with df, not copied (copy-on-write).
+
+	input:
+	df (DataFrame object)
+	columns (list of str): the columns kept, those missing from df are skipped
+
+	output:
+	df_projected (DataFrame object)
+	"""
+	return df[[column for column in columns if column in df.columns]]
+
+
+def _root(values):
+	while isinstance(values.base, np.ndarray):
+		values = values.base
+	return values
+
+
+def _buffers(series):
+	"""
+	Return the (key, bytes) of the buffers holding a column: numpy buffers are keyed by the address of the array owning
+	the memory, so views and shared columns are only counted once; other arrays are counted whole.
+	"""
+	if isinstance(series.dtype, pd.CategoricalDtype):
+		codes = _root(series.array.codes)
+		categories = series.cat.categories
+		return [(codes.__array_interface__["data"][0], codes.nbytes), (("categories", id(categories)), int(categories.memory_usage(deep=True)))]
+	if isinstance(series.dtype, np.dtype) and series.dtype.kind != "O":
+		values = _root(series.to_numpy(copy=False))
+		return [(values.__array_interface__["data"][0], values.nbytes)]
+	return [(("array", id(series.array)), int(series.memory_usage(deep=True, index=False)))]
+
+
+def _columns(name, value):
+	if isinstance(value, pd.DataFrame):
+		return [(name, column, value[column]) for column in value.columns]
+	if isinstance(value, pd.Series):
+		return [(name, value.name, value)]
+	if isinstance(value, np.ndarray):
+		return [(name, None, pd.Series(value, copy=False))]
+	if isinstance(value, (tuple, list)):
+		return [column for i, item in enumerate(value) for column in _columns("%s[%d]" % (name, i), item)]
+	return []
+
+
+def memory_report(objects):
+	"""
+	Return the memory held by the frames and series of a working set, column by column.
+	A buffer shared by several objects (a projection, a slice, a column of a subset) is counted once, at its first
+	appearance, so the total is the memory actually held, not the sum of the sizes of the objects.
+
+	input:
+	objects (dict): name -> DataFrame, Series, ndarray or tuple of these (e.g. the result of nutrient_time)
+
+	output:
+	report (DataFrame object): columns "object", "column", "dtype", "rows", "bytes" and "shared" (the buffer was already counted);
+	the working set is report["bytes"][~report["shared"]].sum(), see working_set_bytes
+
+	Example:
+	df_env = wqfn.loc_subset(df, "langstone", columns=SERIES_COLUMNS)
+	memory_report({"df": df, "df_env": df_env, "nitrite": wqfn.nutrient_time(df, "langstone", 118)})
+	"""
+	seen = set()
+	report = []
+	for name, value in objects.items():
+		for object_name, column, series in _columns(name, value):
+			buffers = _buffers(series)
+			shared = all(key in seen for key, _ in buffers)
+			report.append({
+				"object": object_name,
+				"column": column,
+				"dtype": str(series.dtype),
+				"rows": len(series),
+				"bytes": sum(nbytes for key, nbytes in buffers if key not in seen),
+				"shared": shared,
+			})
+			seen.update(key for key, _ in buffers)
+	return pd.DataFrame(report, columns=["object", "column", "dtype", "rows", "bytes", "shared"])
+
+
+def working_set_bytes(objects):
+	"""
+	Return the bytes held by the frames and series of a working set, shared buffers counted once, see memory_report.
+	"""
+	return int(memory_report(objects)["bytes"].sum())
+
+
+class Query:
+	"""
+	Lazy selection of the main dataset: the filters are accumulated and only evaluated when a result is asked for,
+	in a single pass that starts from the most selective index lookup available (partitioned store, sampling-point index,
+	determinand index) and evaluates the remaining predicates on the surviving rows only, with one take at the end.
+
+	input:
+	df (DataFrame object, SamplingPointIndex or PartitionedStore)
+
+	Example:
+	time, nitrite = Query(df).sites(["G0003616", "G0003625"], "notation").determinands(118).season("summer").between("2010-01-01", "2019-12-31").series()
+	df_env = Query(df).sites("langstone").columns(SERIES_COLUMNS).frame()
+
+	.. warning::
+	Each builder method returns a new Query: a partial query can be reused, e.g. for the summer and the winter.
+	"""
+
+	def __init__(self, df):
+		self.df = df
+		self.place = None
+		self.location_type = "label"
+		self.duplicates = "drop"
+		self.codes = None
+		self.month_list = None
+		self.start = None
+		self.end = None
+		self.projection = None
+		self.plan = []
+
+	def _with(self, **predicates):
+		query = copy.copy(self)
+		query.plan = []
+		for name, value in predicates.items():
+			setattr(query, name, value)
+		return query
+
+	def sites(self, place, location_type="label", duplicates="drop"):
+		"""
+		Keep the sampling points whose label/notation contains any of the places, as loc_subset; "" keeps all.
+		"""
+		return self._with(place=place, location_type=location_type, duplicates=duplicates)
+
+	def determinands(self, determinands):
+		"""
+		Keep one or more determinands, or a family of WaterQualityFunction_determinand.FAMILIES, e.g. "ammonia".
+		"""
+		return self._with(codes=np.atleast_1d(wqfd.codes(determinands)).tolist())
+
+	def months(self, months):
+		return self._with(month_list=np.atleast_1d(months).tolist())
+
+	def season(self, name, season_months=SEASON_MONTHS):
+		"""
+		Keep the months of a season, e.g. "summer" (may-aug) or "winter" (oct-march).
+		"""
+		return self.months(season_months[name])
+
+	def between(self, start=None, end=None):
+		"""
+		Keep the samples taken from the day start to the day end included, e.g. between("2010-01-01", "2019-12-31").
+		"""
+		return self._with(start=None if start is None else pd.Timestamp(start), end=None if end is None else pd.Timestamp(end))
+
+	def columns(self, columns):
+		"""
+		Only carry these columns into the result of frame(), e.g. SERIES_COLUMNS; "Date" and "qualifier" are computed if missing.
+		"""
+		return self._with(projection=list(columns))
+
+	def explain(self):
+		"""
+		Return the steps of the last evaluation, in the order they were run.
+		"""
+		return list(self.plan)
+
+	def _sample_day(self, base, rows):
+		if "Date" in base.columns and pd.api.types.is_datetime64_any_dtype(base["Date"]):
+			return _gather(base["Date"].to_numpy(), rows)
+		sample_time = base['sample.sampleDateTime']
+		if not pd.api.types.is_datetime64_any_dtype(sample_time):
+			sample_time = pd.to_datetime(sample_time)
+		return _gather(sample_time.dt.normalize().to_numpy(), rows)
+
+	def _read_columns(self, store, columns):
+		if columns is None:
+			return None
+		columns = list(columns)
+		if self.month_list is not None or self.start is not None or self.end is not None:
+			columns += ["Date"]
+		columns += [DERIVED_COLUMNS[column][0] for column in columns if column in DERIVED_COLUMNS]
+		stored = store.columns()
+		return [column for column in dict.fromkeys(columns) if column in stored]
+
+	@profiled
+	def positions(self, columns=None):
+		"""
+		Evaluate the predicates and return the frame they apply to and the positions of the selected rows.
+		With a PartitionedStore only the given columns (and those the predicates need) are read.
+
+		output:
+		base (DataFrame object), rows (ndarray of int)
+		"""
+		self.plan = []
+		df = self.df
+		place, codes = self.place, self.codes
+		rows = None
+
+		if isinstance(df, PartitionedStore):
+			years = None
+			if self.start is not None and self.end is not None:
+				years = list(range(self.start.year, self.end.year + 1))
+			df = df.read(place, self.location_type, years=years, determinands=codes, columns=self._read_columns(df, columns))
+			self.plan.append("partitioned store: read the partitions of the sites, years and determinands")
+			place, codes = None, None
+
+		if isinstance(df, SamplingPointIndex):
+			if place is not None:
+				rows = df.positions(place, self.location_type)
+				self.plan.append("sampling point index: %d rows of %s" % (len(rows), place))
+				place = None
+			df = df.df
+		base = df
+
+		if codes is not None and rows is None:
+			index = wqfd.determinand_index(base)
+			if index is not None:
+				rows = index.rows(codes)
+				self.plan.append("determinand index: %d rows of %s" % (len(rows), codes))
+				codes = None
+
+		if place is not None:
+			locations = base[LOCATION_COLUMNS[self.location_type]]
+			if isinstance(locations.dtype, pd.CategoricalDtype):
+				location_codes, uniques = locations.cat.codes.to_numpy(), locations.cat.categories
+			else:
+				location_codes, uniques = pd.factorize(locations)
+			location_codes = _gather(location_codes, rows)
+			tokens = pd.Series(np.asarray(uniques, dtype=object)).str.lower()
+			positions = np.arange(len(base)) if rows is None else rows
+			if self.duplicates == "keep" and np.size(place)>1:
+				rows = np.concatenate([positions[np.append(match_places(tokens, place_), False)[location_codes]] for place_ in place])
+			else:
+				rows = positions[np.append(match_places(tokens, place), False)[location_codes]]
+			self.plan.append("sites scan of the unique %ss: %d rows" % (self.location_type, len(rows)))
+
+		if codes is not None:
+			keep = np.isin(_gather(base['determinand.notation'].to_numpy(), rows), codes)
+			rows = np.flatnonzero(keep) if rows is None else rows[keep]
+			self.plan.append("determinands %s: %d rows" % (codes, len(rows)))
+
+		if self.month_list is not None or self.start is not None or self.end is not None:
+			sample_time = pd.DatetimeIndex(self._sample_day(base, rows))
+			keep = np.ones(len(sample_time), dtype=bool)
+			if self.month_list is not None:
+				keep &= np.isin(sample_time.month, self.month_list)
+			if self.start is not None:
+				keep &= sample_time >= self.start
+			if self.end is not None:
+				keep &= sample_time <= self.end
+			rows = np.flatnonzero(keep) if rows is None else rows[keep]
+			self.plan.append("months/dates: %d rows" % len(rows))
+
+		if rows is None:
+			rows = np.arange(len(base))
+		return(base, rows)
+
+	def frame(self, columns=None):
+		"""
+		Return the selected rows as a new frame, optionally only some columns (default those of columns()); "Date" and "qualifier" are computed if asked for and missing.
+		Rows are gathered with one take, or sliced when they are consecutive (e.g. a site of a SamplingPointIndex):
+		a slice shares the memory of the frame until it is modified (copy-on-write).
+		"""
+		columns = self.projection if columns is None else list(columns)
+		base, rows = self.positions(columns)
+		rows = _contiguous(rows) or rows
+		if columns is None:
+			return base.iloc[rows] if isinstance(rows, slice) else base.take(rows)
+		return _take_columns(base, rows, columns)
+
+	@profiled
+	def series(self, date_format="datetime64", transform=None):
+		"""
+		Return (time, result) of the selected determinands sorted by date, as nutrient_time: a single determinand as Series,
+		several determinands concatenated one after the other as arrays. Samples of the same day are ordered by sampling point
+		(see _date_order), or by time on a frame sorted with sort_by_time.
+
+		input:
+		date_format (str): see format_dates
+		transform (callable, optional): applied to the selected rows (columns "Date", 'determinand.notation', "result" and "qualifier")
+		before they are split into series, e.g. functools.partial(WaterQualityFunction_nutrient.censor, method="half");
+		if it adds a boolean "censored" column, it is returned as a third item (time, result, censored)
+		"""
+		codes = self.codes if self.codes is not None else list(pd.unique(self.frame(['determinand.notation'])['determinand.notation']))
+		columns = ["Date", 'determinand.notation', "result"] + ([QUALIFIER_COLUMN] if transform is not None else [])
+		blocks = time_blocks(self.df)
+		presorted = blocks is not None and self.place is not None and self.duplicates == "drop" and self.month_list is None and self.start is None and self.end is None
+		if presorted:
+			self.plan = ["time blocks: one slice per site and determinand"]
+			if transform is None:
+				return _sorted_time_series(self.df, blocks, self.place, codes if len(codes)>1 else codes[0], self.location_type, date_format)
+			rows = np.concatenate([blocks.positions(self.place, n, self.location_type) for n in codes])
+			df_env = _take_columns(self.df, rows, columns)
+		else:
+			df_env = self.frame(columns + SITE_COLUMNS)
+		if transform is not None:
+			df_env = transform(df_env)
+
+		values = ["result"] + (["censored"] if "censored" in df_env.columns else [])
+		series = {column: [] for column in ["Date"] + values}
+		for n in codes:
+			df_n = df_env[df_env['determinand.notation'] == n]
+			if not presorted:
+				df_n = df_n.iloc[_date_order(df_n)]
+			for column in series:
+				series[column].append(df_n[column])
+		if len(codes)>1:
+			series = {column: np.concatenate(items).flatten() for column, items in series.items()}
+		else:
+			series = {column: items[0] for column, items in series.items()}
+		return(format_dates(series["Date"], date_format),) + tuple(series[column] for column in values)
+
+	@profiled
+	def split_seasons(self, season_months=SEASON_MONTHS, columns=None):
+		"""
+		Return the selected rows split into seasons, in a single pass: each row is tagged with the code of its season
+		(the position of the season in season_months) in a "season" column; rows are sorted by season and date (samples of
+		the same day by sampling point, see _date_order), and each season is returned as a slice of the same frame.
+
+		output:
+		seasons (dict): season name -> DataFrame object, sorted by date
+		"""
+		columns = self.projection if columns is None else list(columns)
+		df_env = self.frame(None if columns is None else list(dict.fromkeys(columns + ["Date"] + SITE_COLUMNS)))
+		df_env = df_env.assign(Date=_sample_day(df_env))
+
+		month = df_env["Date"].dt.month.to_numpy()
+		season = np.full(len(df_env), -1, dtype=np.int8)
+		for code, months in enumerate(season_months.values()):
+			season[np.isin(month, months)] = code
+		df_env = df_env.assign(season=season)
+
+		df_env = df_env[season >= 0]
+		df_env = df_env.iloc[_date_order(df_env, "season")]
+		if columns is not None:
+			df_env = df_env[list(dict.fromkeys(columns + ["Date", "season"]))]
+		bounds = np.searchsorted(df_env["season"].to_numpy(), np.arange(len(season_months) + 1))
+		return {name: df_env.iloc[bounds[code]:bounds[code + 1]] for code, name in enumerate(season_months)}
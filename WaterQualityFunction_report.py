@@ -0,0 +1,236 @@
+import os
+import json
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import matplotlib.pyplot as plt
+import numpy as np
+
+import WaterQualityFunction_plot as wqfplot
+
+
+_shared_df = None
+
+
+def _set_shared(df):
+	global _shared_df
+	_shared_df = df
+
+
+def panel_series(df, panel):
+	"""
+	Return the (time, value) arrays of a panel; for a panel with a "statistic", the (site position, statistic) arrays.
+
+	input:
+	df (DataFrame object)
+	panel (dict): see run_report
+
+	output:
+	time (ndarray), value (ndarray)
+	"""
+	determinands = panel["determinands"] if panel.get("kind", "nutrient") == "nutrient" else None
+	if "statistic" in panel:
+		return site_statistics(df, panel["sites"], determinands, panel["statistic"], panel.get("years"), panel.get("location_type", "notation"), panel.get("season"), panel.get("censoring", "raw"))
+	time, value = wqfplot.location_series(df, panel.get("sites", ""), determinands, panel.get("location_type", "notation"), panel.get("season"), panel.get("censoring", "raw"))
+	return(np.asarray(time), np.asarray(value))
+
+
+def site_statistics(df, sites, nutrient_determinand=None, statistic="mean", years=None, location_type="notation", season=None, censoring="raw"):
+	"""
+	Return a statistic of the series of each site over a range of years, as the baseline and present-day
+	figures of the report (ReportPlots/figure5.png to figure8.png) compare the estuary sites.
+
+	input:
+	df (DataFrame object)
+	sites (list of str): the sites, one point each, e.g. ["G0003493", "G0016920"]
+	nutrient_determinand (int or list of int): the determinand(s), see WaterQualityFunction_plot.location_series; None for the DAIN
+	statistic (str): "mean" or "median"
+	years (list of int, optional): first and last year of the samples, either can be None, e.g. [None, 2003]
+	location_type (str): either "label" or "notation"
+	season (str, optional): None (whole year), "summer" or "winter"
+	censoring (str): results below the limit of detection, see WaterQualityFunction_plot.location_series
+
+	output:
+	position (ndarray): 0, 1, ... one per site
+	value (ndarray): the statistic of each site, NaN for a site without samples in the years
+	"""
+	statistic = {"mean": np.mean, "median": np.median}[statistic]
+	first, last = years if years is not None else (None, None)
+	values = []
+	for site in sites:
+		time, value = wqfplot.location_series(df, site, nutrient_determinand, location_type, season, censoring)
+		year = pd.DatetimeIndex(np.asarray(time, dtype="datetime64[ns]")).year
+		keep = np.ones(len(year), dtype=bool)
+		if first is not None:
+			keep &= year >= first
+		if last is not None:
+			keep &= year <= last
+		values.append(statistic(np.asarray(value, dtype=np.float64)[keep]) if keep.any() else np.nan)
+	return(np.arange(len(values)), np.asarray(values))
+
+
+def _worker_series(panel):
+	return panel_series(_shared_df, panel)
+
+
+def draw_panel(ax, time, value, panel):
+	"""
+	Draw a panel on an axis with WaterQualityFunction_plot.draw_series, as the customizable plot functions draw their series.
+	"""
+	return wqfplot.draw_series(ax, time, value, panel.get("plt_kwargs", {}), panel.get("sct_kwargs", {}), panel.get("xlabel"), panel.get("ylabel"),
+		panel.get("label_str"), panel.get("plot_title"), panel.get("title_fontsize", 18), panel.get("decimate"))
+
+
+def format_axis(ax, settings):
+	"""
+	Apply the settings of an axis declared in a figure of run_report, as the report notebooks finish their axes.
+
+	input:
+	ax (Axes object)
+	settings (dict): any of
+		"xlabel", "ylabel" (str), "ylabel_kwargs" (dict, e.g. {"rotation": 270, "labelpad": 20}),
+		"ylabel_right", "ticks_right" (bool): the y label and ticks on the right of the axis,
+		"ylim" (list), "xticks" (list), "xticklabels" (list of str), "grid" (dict): keywords of ax.grid, e.g. {"color": "#CCCCCC", "linestyle": "--"}
+	"""
+	if "xlabel" in settings:
+		ax.set_xlabel(settings["xlabel"])
+	if "ylabel" in settings:
+		ax.set_ylabel(settings["ylabel"], **settings.get("ylabel_kwargs", {}))
+	if settings.get("ylabel_right"):
+		ax.yaxis.set_label_position("right")
+	if settings.get("ticks_right"):
+		ax.yaxis.tick_right()
+	if "ylim" in settings:
+		ax.set_ylim(settings["ylim"])
+	if "xticks" in settings:
+		ax.set_xticks(settings["xticks"])
+	if "xticklabels" in settings:
+		ax.set_xticklabels(settings["xticklabels"])
+	if "grid" in settings:
+		ax.grid(which="major", **settings["grid"])
+	return ax
+
+
+def compute_series(df, panels, processes=None):
+	"""
+	Return the (time, value) arrays of all the panels, computed in a pool of processes.
+	On Linux the workers are forked after the frame is set as a module global, so they read the parent's memory
+	(copy-on-write) instead of receiving a pickled copy of the frame.
+
+	input:
+	df (DataFrame object)
+	panels (list of dict): see run_report
+	processes (int, optional): number of worker processes, default os.cpu_count(); 1 computes in the calling process
+
+	output:
+	series (list of (time, value) tuples), in the order of panels
+	"""
+	if processes == 1 or len(panels) <= 1:
+		return [panel_series(df, panel) for panel in panels]
+
+	if "fork" in multiprocessing.get_all_start_methods():
+		_set_shared(df)
+		executor = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("fork"))
+	else:
+		executor = ProcessPoolExecutor(max_workers=processes, initializer=_set_shared, initargs=(df,))
+	try:
+		with executor:
+			return list(executor.map(_worker_series, panels))
+	finally:
+		_set_shared(None)
+
+
+MATHTEXT_STYLE = {"text.usetex": False, "mathtext.fontset": "cm", "axes.formatter.use_mathtext": True}
+
+
+def figure_hash(figure, series, style=None):
+	"""
+	Return the hash of everything a figure is drawn from: its declaration, the style and the (time, value) arrays of its panels.
+	"""
+	digest = hashlib.sha256()
+	digest.update(json.dumps(figure, sort_keys=True, default=str).encode())
+	digest.update(json.dumps(style or {}, sort_keys=True, default=str).encode())
+	for time, value in series:
+		digest.update(np.asarray(time, dtype="datetime64[ns]").tobytes())
+		digest.update(np.asarray(value, dtype=np.float64).tobytes())
+	return digest.hexdigest()
+
+
+def _read_manifest(manifest):
+	if manifest is None or not os.path.exists(manifest):
+		return {}
+	with open(manifest) as manifest_file:
+		return json.load(manifest_file)
+
+
+def run_report(df, figures, processes=None, style=None, manifest=None, force=False, mathtext=False):
+	"""
+	Render a report declared as a list of figures, computing all the series in parallel and saving each figure to file.
+	With a manifest, a figure is only rendered again when its declaration, its style or the data of its panels changed
+	(or its file is missing).
+
+	input:
+	df (DataFrame object)
+	figures (list of dict): each figure has
+		"filename" (str): output file, the format follows the extension, e.g. "ReportPlots/figure5.png" or ".pdf"
+		"nrows", "ncols" (int), "figsize" (tuple), "sharex", "sharey" (bool or str): as in plt.subplots
+		"subplots_adjust", "suptitle" (dict, optional): keywords of fig.subplots_adjust and fig.suptitle
+		"axes" (list of dict, optional): settings of the axes, each with "axis" (int) and the keys of format_axis
+		"panels" (list of dict): each panel has
+			"axis" (int): position of the axis in the flattened grid, default 0
+			"kind" (str): either "nutrient" or "DAIN"
+			"sites" (str or list of str): the location(s) of interest, e.g. ["G0003616", "G0003625"]
+			"location_type" (str): either "label" or "notation", default "notation"
+			"determinands" (int or list of int): for "nutrient" panels, e.g. [9993, 111, 119]
+			"season" (str, optional): None (whole year), "summer" or "winter"
+			"censoring" (str, optional): results below the limit of detection, "raw" (default), "half" or "exclude", see WaterQualityFunction_nutrient.censor
+			"statistic" (str, optional): "mean" or "median" of each site instead of the series, with "years" (list), see site_statistics
+			"plt_kwargs", "sct_kwargs" (dict), "xlabel", "ylabel", "label_str", "plot_title" (str), "title_fontsize" (int), "decimate" (int or bool): as in WaterQualityFunction_plot.draw_series
+	processes (int, optional): number of worker processes
+	style (dict, optional): matplotlib style, e.g. mplt_style_n.style1
+	manifest (str, optional): JSON file of the hashes of the rendered figures, e.g. "ReportPlots/manifest.json"
+	force (bool): render all the figures, whatever the manifest
+	mathtext (bool): render the labels with matplotlib's mathtext instead of a LaTeX subprocess (overrides "text.usetex" of the style)
+
+	output:
+	filenames (list of str): the figures rendered
+	"""
+	style = dict(style if style is not None else {})
+	if mathtext:
+		style.update(MATHTEXT_STYLE)
+
+	panels = [panel for figure in figures for panel in figure["panels"]]
+	series = iter(compute_series(df, panels, processes))
+	hashes = _read_manifest(manifest)
+
+	filenames = []
+	with plt.style.context(style):
+		for figure in figures:
+			figure_series = [next(series) for panel in figure["panels"]]
+			digest = figure_hash(figure, figure_series, style)
+			if not force and hashes.get(figure["filename"]) == digest and os.path.exists(figure["filename"]):
+				continue
+			fig, axes = plt.subplots(nrows=figure.get("nrows", 1), ncols=figure.get("ncols", 1), sharex=figure.get("sharex", False), sharey=figure.get("sharey", False), figsize=figure.get("figsize"), squeeze=False)
+			axes = axes.flatten()
+			if "subplots_adjust" in figure:
+				fig.subplots_adjust(**figure["subplots_adjust"])
+			for panel, (time, value) in zip(figure["panels"], figure_series):
+				draw_panel(axes[panel.get("axis", 0)], time, value, panel)
+			for settings in figure.get("axes", []):
+				format_axis(axes[settings.get("axis", 0)], settings)
+			if "suptitle" in figure:
+				fig.suptitle(**figure["suptitle"])
+			directory = os.path.dirname(figure["filename"])
+			if directory:
+				os.makedirs(directory, exist_ok=True)
+			fig.savefig(figure["filename"], bbox_inches="tight")
+			plt.close(fig)
+			filenames.append(figure["filename"])
+			hashes[figure["filename"]] = digest
+
+	if manifest is not None:
+		with open(manifest, "w") as manifest_file:
+			json.dump(hashes, manifest_file, indent=1, sort_keys=True)
+	return filenames
@@ -0,0 +1,163 @@
+import pandas as pd
+import numpy as np
+
+
+SAMPLING_POINT_COLUMNS = ['sample.samplingPoint.notation', 'sample.samplingPoint.label', 'sample.samplingPoint.easting', 'sample.samplingPoint.northing']
+
+BNG_CRS = "EPSG:27700"
+
+
+def sampling_points(df):
+	"""
+	Return the unique sampling points of the dataset (notation, label, easting, northing), one row per notation.
+	"""
+	columns = [column for column in SAMPLING_POINT_COLUMNS + ["lat", "lon"] if column in df.columns]
+	points = df[columns].drop_duplicates(subset='sample.samplingPoint.notation')
+	points = points.dropna(subset=['sample.samplingPoint.easting', 'sample.samplingPoint.northing'])
+	return points.astype({column: str for column in SAMPLING_POINT_COLUMNS[:2] if column in points.columns}).reset_index(drop=True)
+
+
+class SamplingPointTree:
+	"""
+	KD-tree of the unique sampling points of the dataset, on their British National Grid easting and northing (metres).
+	Queries return lists of notations, to be passed on to loc_subset(df, notations, "notation").
+
+	input:
+	df (DataFrame object): the main dataset, or the frame of sampling_points(df)
+
+	.. warning::
+	The tree requires scipy; without it the queries fall back to brute-force distances, fine for a few thousand sampling points.
+	"""
+
+	def __init__(self, df):
+		self.points = sampling_points(df)
+		self.notations = self.points['sample.samplingPoint.notation'].to_numpy()
+		self.xy = self.points[['sample.samplingPoint.easting', 'sample.samplingPoint.northing']].to_numpy(dtype=np.float64)
+		try:
+			from scipy.spatial import cKDTree
+			self.tree = cKDTree(self.xy)
+		except ImportError:
+			self.tree = None
+
+	def __len__(self):
+		return len(self.notations)
+
+	def coordinates(self, notations):
+		"""
+		Return the (easting, northing) of sampling points given by notation; unknown notations raise KeyError.
+		"""
+		position = pd.Index(self.notations).get_indexer([str(notation) for notation in np.atleast_1d(notations)])
+		if (position < 0).any():
+			raise KeyError("unknown sampling point(s): %s" % list(np.atleast_1d(notations)[position < 0]))
+		return self.xy[position]
+
+	def _ball(self, xy, radius):
+		if self.tree is not None:
+			return self.tree.query_ball_point(xy, radius, return_sorted=True)
+		distance = np.hypot(xy[:, None, 0] - self.xy[None, :, 0], xy[:, None, 1] - self.xy[None, :, 1])
+		return [np.flatnonzero(row <= radius) for row in distance]
+
+	def within(self, xy, radius):
+		"""
+		Return the notations of the sampling points within radius metres of each point.
+
+		input:
+		xy (array of shape (2,) or (n, 2)): easting and northing of the points, in metres
+		radius (float): in metres
+
+		output:
+		notations (list of list of str): one list per point
+		"""
+		xy = np.atleast_2d(np.asarray(xy, dtype=np.float64))
+		return [self.notations[np.asarray(ball, dtype=np.intp)].tolist() for ball in self._ball(xy, radius)]
+
+	def near_sites(self, notations, radius):
+		"""
+		Return the notations of the sampling points within radius metres of each of the given sampling points (themselves included).
+
+		output:
+		near (dict): notation -> list of notations
+		"""
+		notations = [str(notation) for notation in np.atleast_1d(notations)]
+		return dict(zip(notations, self.within(self.coordinates(notations), radius)))
+
+	def nearest(self, xy, k=1, max_distance=np.inf):
+		"""
+		Return the k nearest sampling points of each point, in bulk.
+
+		input:
+		xy (array of shape (2,) or (n, 2)): easting and northing of the points, in metres
+		k (int): number of neighbours
+		max_distance (float): neighbours further than this (metres) are left out
+
+		output:
+		notations (list of list of str), distances (list of ndarray): one entry per point, nearest first
+		"""
+		xy = np.atleast_2d(np.asarray(xy, dtype=np.float64))
+		k = min(k, len(self))
+		if self.tree is not None:
+			distance, position = self.tree.query(xy, k=k, distance_upper_bound=max_distance)
+			distance, position = distance.reshape(len(xy), k), position.reshape(len(xy), k)
+		else:
+			distance = np.hypot(xy[:, None, 0] - self.xy[None, :, 0], xy[:, None, 1] - self.xy[None, :, 1])
+			position = np.argsort(distance, axis=1, kind="stable")[:, :k]
+			distance = np.take_along_axis(distance, position, axis=1)
+		found = distance <= max_distance
+		return([self.notations[row[keep]].tolist() for row, keep in zip(position, found)], [row[keep] for row, keep in zip(distance, found)])
+
+	def nearest_sites(self, notations, k=1, max_distance=np.inf):
+		"""
+		Return the k nearest other sampling points of each of the given sampling points.
+
+		output:
+		nearest (dict): notation -> list of notations, nearest first
+		"""
+		notations = [str(notation) for notation in np.atleast_1d(notations)]
+		neighbours, _ = self.nearest(self.coordinates(notations), k + 1, max_distance)
+		return {notation: [other for other in row if other != notation][:k] for notation, row in zip(notations, neighbours)}
+
+	def groups(self, radius):
+		"""
+		Return the groups of sampling points chained by distances of at most radius metres (connected components),
+		e.g. the clusters of sites of the same stretch of coast.
+
+		output:
+		groups (list of list of str): sorted by size, largest first
+		"""
+		if self.tree is not None:
+			from scipy.sparse import coo_matrix
+			from scipy.sparse.csgraph import connected_components
+			pairs = self.tree.query_pairs(radius, output_type="ndarray")
+			graph = coo_matrix((np.ones(len(pairs), dtype=np.int8), (pairs[:, 0], pairs[:, 1])), shape=(len(self), len(self)))
+			label = connected_components(graph, directed=False)[1]
+		else:
+			label = np.arange(len(self))
+			for i, ball in enumerate(self._ball(self.xy, radius)):
+				roots = np.unique(label[ball])
+				label[np.isin(label, roots)] = roots.min()
+
+		groups = pd.Series(self.notations).groupby(label, sort=False).agg(list).tolist()
+		return sorted(groups, key=len, reverse=True)
+
+	def same_segment(self, segments, buffer=500, crs=BNG_CRS):
+		"""
+		Return the sampling points on each segment of a river network or sea area: each sampling point is buffered by
+		buffer metres and spatially joined with the segments, once for all the sampling points.
+
+		input:
+		segments (GeoDataFrame object): lines or polygons, e.g. the WatercourseLink or Limits_and_boundaries shapefiles, in any crs
+		buffer (float): radius of the buffer, in metres
+		crs (str): the crs of easting and northing, default British National Grid
+
+		output:
+		segments_sites (dict): index of the segment -> list of notations
+
+		.. warning::
+		Requires geopandas.
+		"""
+		import geopandas as gpd
+
+		points = gpd.GeoDataFrame({"notation": self.notations}, geometry=gpd.points_from_xy(self.xy[:, 0], self.xy[:, 1]), crs=crs)
+		points["geometry"] = points.geometry.buffer(buffer)
+		join = gpd.sjoin(points, segments.to_crs(crs), how="inner", predicate="intersects")
+		return join.groupby("index_right", sort=True)["notation"].agg(list).to_dict()
@@ -0,0 +1,145 @@
+import pandas as pd
+import numpy as np
+
+import WaterQualityFunction_nutrient as wqfn
+import WaterQualityFunction_determinand as wqfd
+
+
+SERIES_KEYS = ["site", "determinand", "season"]
+
+DAIN_DETERMINANDS = wqfd.FAMILIES["DAIN"]
+
+DAIN_CODE = 0
+
+
+def long_series(df, notations, determinands, seasons=False, season_months=wqfn.SEASON_MONTHS, dain=False):
+	"""
+	Return the tidy long frame of batch_time, optionally with the DAIN of each site as the pseudo-determinand DAIN_CODE
+	(sum of the results of DAIN_DETERMINANDS on the same day, as DAIN_time).
+
+	input:
+	df (DataFrame object, SamplingPointIndex or PartitionedStore)
+	notations (list of str): the sampling points of interest, e.g. ["G0003368", "G0003508"]
+	determinands (list of int): the determinands of interest, e.g. [111, 116]
+	seasons (bool): see batch_time
+	season_months (dict): see season_split
+	dain (bool): also return the DAIN series of each site
+
+	output:
+	df_long (DataFrame object): columns "site", "determinand", "season", "Date", "result"
+	"""
+	determinands = list(np.atleast_1d(wqfd.codes(determinands)))
+	df_long = wqfn.batch_time(df, notations, sorted(set(determinands) | (set(DAIN_DETERMINANDS) if dain else set())), seasons, season_months)
+	if not dain:
+		return df_long
+
+	df_dain = df_long[df_long["determinand"].isin(DAIN_DETERMINANDS)].groupby(["site", "season", "Date"], sort=True)["result"].sum().reset_index()
+	df_long = pd.concat([df_long[df_long["determinand"].isin(determinands)], df_dain.assign(determinand=DAIN_CODE)], ignore_index=True)
+	return df_long[SERIES_KEYS + ["Date", "result"]].sort_values(by=SERIES_KEYS + ["Date"], kind="stable").reset_index(drop=True)
+
+
+def _season_start(months):
+	"""
+	Return the first month of a season; for seasons across the new year (e.g. winter, oct-march) the month after the gap.
+	"""
+	months = np.sort(np.asarray(months))
+	gaps = np.flatnonzero(np.diff(months) > 1)
+	if len(gaps) and months[0] == 1 and months[-1] == 12:
+		return months[gaps[-1] + 1]
+	return months[0]
+
+
+def period_start(date, freq="month", season=None, season_months=wqfn.SEASON_MONTHS):
+	"""
+	Return the start of the period of each date, as datetime64: the first day of the month, of the year, or of the season
+	(the first day of its first month: the winter of oct-march 2010 starts on 2009-10-01).
+
+	input:
+	date (Series object): datetime64 days, e.g. the "Date" column of batch_time
+	freq (str): "month", "season" or "year"
+	season (Series object): for freq "season", the season of each date, e.g. the "season" column of batch_time(..., seasons=True)
+	season_months (dict): see season_split
+	"""
+	if freq == "month":
+		return date.dt.to_period("M").dt.start_time
+	if freq == "year":
+		return date.dt.to_period("Y").dt.start_time
+	year = date.dt.year.to_numpy()
+	month = date.dt.month.to_numpy()
+	first_month = np.ones(len(date), dtype=np.int64)
+	for name, months in season_months.items():
+		is_season = season.to_numpy() == name
+		first_month[is_season] = _season_start(months)
+	year = np.where(month < first_month, year - 1, year)
+	return pd.Series(pd.to_datetime(pd.DataFrame({"year": year, "month": first_month, "day": 1})).to_numpy(), index=date.index)
+
+
+def resample_series(df_long, freq="month", stats=("mean", "median", "count"), quantiles=(), season_months=wqfn.SEASON_MONTHS):
+	"""
+	Return windowed aggregates of every series of a long frame, in one groupby over all the sites, determinands and seasons.
+
+	input:
+	df_long (DataFrame object): from batch_time or long_series; for freq "season" from batch_time(..., seasons=True)
+	freq (str): "month", "season" or "year"
+	stats (list of str): pandas aggregations of the results, e.g. ("mean", "median", "min", "max", "std", "count")
+	quantiles (list of float): quantiles of the results, e.g. (0.1, 0.9), as columns "q10", "q90"
+	season_months (dict): see season_split
+
+	output:
+	df_stats (DataFrame object): columns "site", "determinand", "season", "Date" (start of the period) and one column per statistic, sorted by series and date
+	"""
+	period = period_start(df_long["Date"], freq, df_long["season"], season_months)
+	grouped = df_long.assign(Date=period).groupby(SERIES_KEYS + ["Date"], sort=True)["result"]
+	df_stats = grouped.agg(list(stats))
+	for q in quantiles:
+		df_stats["q%g" % (100 * q)] = grouped.quantile(q)
+	return df_stats.reset_index()
+
+
+def rolling_series(df_long, window="365D", stats=("median",), quantiles=(), min_periods=1):
+	"""
+	Return time-based rolling aggregates of every series of a long frame, one value per sample, in one grouped rolling pass.
+
+	input:
+	df_long (DataFrame object): from batch_time or long_series, sorted by series and date
+	window (str or int): time window ending at each sample, e.g. "90D" or "365D"; or a number of samples
+	stats (list of str): rolling aggregations, e.g. ("mean", "median", "min", "max", "std", "count")
+	quantiles (list of float): rolling quantiles, e.g. (0.1, 0.9), as columns "q10", "q90"
+	min_periods (int): minimum number of samples in the window
+
+	output:
+	df_rolling (DataFrame object): columns "site", "determinand", "season", "Date", "result" and one column per statistic, aligned with df_long
+	"""
+	df_long = df_long.sort_values(by=SERIES_KEYS + ["Date"], kind="stable").reset_index(drop=True)
+	rolling = df_long.set_index("Date").groupby(SERIES_KEYS, sort=False)["result"].rolling(window, min_periods=min_periods)
+
+	df_rolling = df_long.copy()
+	for stat in stats:
+		df_rolling[stat] = getattr(rolling, stat)().to_numpy()
+	for q in quantiles:
+		df_rolling["q%g" % (100 * q)] = rolling.quantile(q).to_numpy()
+	return df_rolling
+
+
+def series_quantiles(df_long, quantiles=(0.1, 0.5, 0.9)):
+	"""
+	Return the quantiles of the results of every series of a long frame over the whole period.
+
+	output:
+	df_quantiles (DataFrame object): columns "site", "determinand", "season" and one column per quantile, e.g. "q10", "q50", "q90"
+	"""
+	df_quantiles = df_long.groupby(SERIES_KEYS, sort=True)["result"].quantile(list(quantiles)).unstack()
+	df_quantiles.columns = ["q%g" % (100 * q) for q in df_quantiles.columns]
+	return df_quantiles.reset_index()
+
+
+def to_series(df_stats, column):
+	"""
+	Return a column of resample_series or rolling_series as (time, value) arrays per series, ready to be plotted.
+
+	output:
+	series (dict): (site, determinand, season) -> (time ndarray, value ndarray)
+	"""
+	time = df_stats["Date"].to_numpy()
+	value = df_stats[column].to_numpy()
+	return {key: (time[indices], value[indices]) for key, indices in df_stats.groupby(SERIES_KEYS, sort=False).indices.items()}
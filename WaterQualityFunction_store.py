@@ -0,0 +1,115 @@
+import os
+import json
+
+import pandas as pd
+import numpy as np
+
+from WaterQualityFunction_index import match_places
+
+
+PARTITIONS = ["notation_prefix", "year"]
+
+MANIFEST = "_sampling_points.json"
+
+
+def write_partitioned(df, root, prefix_length=6):
+	"""
+	Write the main dataset as a hive-style partitioned Parquet store, keyed on the prefix of the sampling point
+	notation and on the year of the sample, e.g. root/notation_prefix=SO-G00/year=2010/part-0.parquet.
+	A manifest of the sampling points (notation, label, partition prefix) is written next to the partitions,
+	so that location queries only open the partitions of the matching sampling points.
+
+	input:
+	df (DataFrame object): e.g. from WaterQualityFunction_load.load_govdat
+	root (str): directory of the store
+	prefix_length (int): number of characters of the notation used as partition key, e.g. 6 for "SO-G00"
+
+	output:
+	store (PartitionedStore object)
+
+	.. warning::
+	Requires pyarrow. Existing partitions under root are overwritten.
+	"""
+	import pyarrow as pa
+	import pyarrow.dataset as ds
+
+	notation = df['sample.samplingPoint.notation'].astype(str)
+	df_store = df.assign(notation_prefix=notation.str[:prefix_length], year=pd.to_datetime(df['sample.sampleDateTime']).dt.year)
+	ds.write_dataset(pa.Table.from_pandas(df_store, preserve_index=False), root, format="parquet", partitioning=PARTITIONS, partitioning_flavor="hive", existing_data_behavior="delete_matching")
+
+	sampling_points = df_store[['sample.samplingPoint.notation', 'sample.samplingPoint.label', "notation_prefix"]].drop_duplicates().astype(str)
+	with open(os.path.join(root, MANIFEST), "w") as manifest:
+		json.dump({"prefix_length": prefix_length, "sampling_points": sampling_points.values.tolist()}, manifest)
+	return PartitionedStore(root)
+
+
+class PartitionedStore:
+	"""
+	Reader of a store written by write_partitioned. It can be passed to loc_subset, nutrient_time, nutrient_time_seasons,
+	DAIN_time and DAIN_time_seasons in place of the main dataset: only the partitions of the requested locations are read from disk.
+
+	input:
+	root (str): directory of the store
+	"""
+
+	def __init__(self, root):
+		self.root = root
+		with open(os.path.join(root, MANIFEST)) as manifest:
+			manifest = json.load(manifest)
+		self.prefix_length = manifest["prefix_length"]
+		self.sampling_points = pd.DataFrame(manifest["sampling_points"], columns=['sample.samplingPoint.notation', 'sample.samplingPoint.label', "notation_prefix"])
+
+	def fingerprint(self):
+		return (os.path.abspath(self.root), os.path.getmtime(os.path.join(self.root, MANIFEST)))
+
+	def notations(self, place, location_type="label"):
+		"""
+		Return the notations of the sampling points whose label/notation contains any of the places, as loc_subset matches them.
+		"""
+		column = {"label": 'sample.samplingPoint.label', "notation": 'sample.samplingPoint.notation'}[location_type]
+		return self.sampling_points[match_places(self.sampling_points[column].str.lower(), place)]
+
+	def columns(self):
+		"""
+		Return the names of the stored columns, partition keys excluded.
+		"""
+		import pyarrow.dataset as ds
+
+		names = ds.dataset(self.root, format="parquet", partitioning="hive").schema.names
+		return [name for name in names if name not in PARTITIONS]
+
+	def read(self, place=None, location_type="label", years=None, determinands=None, columns=None):
+		"""
+		Return the rows of the requested locations, years and determinands, reading only the matching partitions.
+
+		input:
+		place (str or list of str, optional): the location(s) of interest, e.g. "langstone" or ["G0003616", "G0003625"]; None or "" return entire catalogue
+		location_type (str): either "label" or "notation"
+		years (list of int, optional): the years of interest
+		determinands (list of int, optional): the determinands of interest
+		columns (list of str, optional): only read these columns
+
+		output:
+		df_subset (DataFrame object)
+		"""
+		import pyarrow.dataset as ds
+
+		dataset = ds.dataset(self.root, format="parquet", partitioning="hive")
+		condition = None
+		conditions = []
+		if place is not None:
+			sampling_points = self.notations(place, location_type)
+			conditions.append(ds.field("notation_prefix").isin(pd.unique(sampling_points["notation_prefix"]).tolist()))
+			conditions.append(ds.field('sample.samplingPoint.notation').isin(pd.unique(sampling_points['sample.samplingPoint.notation']).tolist()))
+		if years is not None:
+			conditions.append(ds.field("year").isin([int(year) for year in np.atleast_1d(years)]))
+		if determinands is not None:
+			conditions.append(ds.field('determinand.notation').isin([int(determinand) for determinand in np.atleast_1d(determinands)]))
+		for condition_ in conditions:
+			condition = condition_ if condition is None else condition & condition_
+
+		df_subset = dataset.to_table(columns=columns, filter=condition).to_pandas()
+		return df_subset.drop(columns=[column for column in PARTITIONS if column in df_subset.columns])
+
+	def subset(self, place, location_type="label"):
+		return self.read(place, location_type)
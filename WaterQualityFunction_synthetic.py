@@ -0,0 +1,92 @@
+import pandas as pd
+import numpy as np
+
+from WaterQualityFunction_determinand import DETERMINANDS
+
+
+MATERIALS = ["RIVER / RUNNING SURFACE WATER", "ESTUARINE WATER", "SEA WATER", "GROUNDWATER"]
+
+PLACES = ["LANGSTONE", "PORTSMOUTH", "HAVANT", "EMSWORTH", "CHICHESTER", "SOUTHAMPTON", "HAYLING", "FAREHAM"]
+
+
+def synthetic_govdat(n_sites=10, determinands=(111, 116, 9943, 119, 118, 9993), years=(2000, 2020), samples_per_year=12, seed=0, with_ids=False):
+	"""
+	Return a synthetic dataset with the columns of the Environment Agency export (as typed by WaterQualityFunction_load.load_govdat),
+	with n_sites x len(determinands) x number of years x samples_per_year rows.
+	Each sample of a site measures all the determinands at the same time, as EA samples do.
+
+	input:
+	n_sites (int): number of sampling points
+	determinands (list of int): determinand codes, see DETERMINANDS
+	years (tuple of int): first and last year
+	samples_per_year (int): number of samples per site and year
+	seed (int): seed of the random generator
+	with_ids (bool): also build the "@id" column of measurement URLs (one string per row, slow and memory-hungry at scale)
+
+	output:
+	df (DataFrame object)
+	"""
+	rng = np.random.default_rng(seed)
+	determinands = np.asarray(determinands, dtype=np.int16)
+	n_years = years[1] - years[0] + 1
+	n_samples = n_sites * n_years * samples_per_year
+
+	sample_site = np.repeat(np.arange(n_sites), n_years * samples_per_year)
+	start = np.datetime64("%d-01-01" % years[0], "s")
+	span = np.int64(n_years * 365.25 * 86400)
+	sample_time = start + np.sort(rng.integers(0, span, size=(n_sites, n_years * samples_per_year)), axis=1).ravel().astype("timedelta64[s]")
+
+	notations = np.array(["SO-%s%07d" % ("GY"[i % 2], 3000 + i) for i in range(n_sites)], dtype=object)
+	labels = np.array(["%s SITE %d" % (PLACES[i % len(PLACES)], i) for i in range(n_sites)], dtype=object)
+	materials = rng.integers(0, len(MATERIALS), size=n_sites)
+	easting = rng.uniform(440000, 480000, size=n_sites).round()
+	northing = rng.uniform(95000, 115000, size=n_sites).round()
+	lat = 50.75 + (northing - 95000) / 111000
+	lon = -1.5 + (easting - 440000) / 70000
+
+	row_sample = np.repeat(np.arange(n_samples), len(determinands))
+	row_site = sample_site[row_sample]
+	row_determinand = np.tile(determinands, n_samples)
+	row_time = pd.DatetimeIndex(sample_time[row_sample])
+	level = np.where(np.isin(row_determinand, (116, 117, 9943)), 2.0, 0.2)
+	result = (rng.lognormal(0, 0.5, size=len(row_sample)) * level).astype(np.float32)
+	censored = rng.random(len(row_sample)) < 0.05
+
+	definitions = [DETERMINANDS.get(int(code), (str(code), "mg/l")) for code in determinands]
+	determinand_index = np.tile(np.arange(len(determinands)), n_samples)
+
+	df = pd.DataFrame({
+		'sample.samplingPoint.notation': pd.Categorical.from_codes(row_site, categories=notations),
+		'sample.samplingPoint.label': pd.Categorical.from_codes(row_site, categories=labels),
+		'sample.sampleDateTime': row_time,
+		'Date': row_time.normalize(),
+		'determinand.label': pd.Categorical([definition for definition, unit in definitions]).take(determinand_index),
+		'determinand.definition': pd.Categorical([definition for definition, unit in definitions]).take(determinand_index),
+		'determinand.notation': row_determinand,
+		'resultQualifier.notation': pd.Categorical(np.where(censored, "<", None), categories=["<", ">"]),
+		'qualifier': censored.astype(np.int8),
+		'result': np.where(censored, np.float32(0.03), result),
+		'determinand.unit.label': pd.Categorical([unit for definition, unit in definitions]).take(determinand_index),
+		'sample.sampledMaterialType.label': pd.Categorical.from_codes(materials[row_site], categories=MATERIALS),
+		'sample.isComplianceSample': False,
+		'sample.purpose.label': pd.Categorical.from_codes(np.zeros(len(row_site), dtype=np.int8), categories=["MONITORING (UK GOVT POLICY - NOT GQA OR RE)"]),
+		'sample.samplingPoint.easting': easting[row_site],
+		'sample.samplingPoint.northing': northing[row_site],
+		'month': row_time.month.astype(np.int8),
+		'yr': row_time.year.astype(np.int16),
+		'lat': lat[row_site],
+		'lon': lon[row_site],
+	})
+	if with_ids:
+		sample_id = pd.Series(notations[row_site]) + "-" + pd.Series(row_sample).astype(str)
+		df.insert(0, '@id', "http://environment.data.gov.uk/water-quality/data/measurement/" + sample_id + "-" + pd.Series(row_determinand).astype(str).str.zfill(4))
+	return df
+
+
+def synthetic_rows(n_rows, determinands=(111, 116, 9943, 119, 118, 9993), years=(2000, 2020), samples_per_year=12, seed=0, with_ids=False):
+	"""
+	Return a synthetic dataset of about n_rows rows, scaling the number of sites.
+	"""
+	rows_per_site = len(determinands) * (years[1] - years[0] + 1) * samples_per_year
+	n_sites = max(1, int(round(n_rows / rows_per_site)))
+	return synthetic_govdat(n_sites, determinands, years, samples_per_year, seed, with_ids)
@@ -0,0 +1,158 @@
+import pandas as pd
+import numpy as np
+
+import WaterQualityFunction_load as wql
+import WaterQualityFunction_nutrient as wqfn
+import WaterQualityFunction_determinand as wqfd
+
+
+DAIN_DETERMINANDS = wqfd.FAMILIES["DAIN"]
+
+
+def sample_id(df):
+	"""
+	Return the id of the sample of each measurement: the "@id" measurement URL without its final determinand segment
+	(".../measurement/SO-Y0003370-2803-0116" -> ".../measurement/SO-Y0003370-2803"),
+	or the sampling point notation and sample time for exports without "@id".
+	"""
+	if '@id' in df.columns:
+		return df['@id'].astype(str).str.rsplit("-", n=1).str[0]
+	return df['sample.samplingPoint.notation'].astype(str) + "@" + pd.to_datetime(df['sample.sampleDateTime']).astype(str)
+
+
+def _union_categories(df, df_new):
+	"""
+	Give the categorical columns of both frames the same categories, so that concatenating them keeps the columns categorical.
+	"""
+	for column in df.columns:
+		if column in df_new.columns and isinstance(df[column].dtype, pd.CategoricalDtype) and isinstance(df_new[column].dtype, pd.CategoricalDtype):
+			categories = df[column].cat.categories.union(df_new[column].cat.categories, sort=False)
+			df[column] = df[column].cat.set_categories(categories)
+			df_new[column] = df_new[column].cat.set_categories(categories)
+	return(df, df_new)
+
+
+def append_samples(df, df_new):
+	"""
+	Append a new monthly export to the main dataset, deduplicating on sample id and determinand: a measurement already
+	in df is replaced by its new version, so re-pulling an overlapping month is harmless.
+
+	input:
+	df (DataFrame object): the main dataset, e.g. from WaterQualityFunction_load.load_govdat
+	df_new (DataFrame object): the new rows, e.g. from WaterQualityFunction_load.read_govdat_csv
+
+	output:
+	df_all (DataFrame object): the updated dataset, with a fresh RangeIndex
+	df_added (DataFrame object): the rows of df_new that were added or replaced, as they appear in df_all
+	"""
+	df_new = wql._apply_schema(df_new.copy())
+	df_new = df_new[[column for column in df.columns if column in df_new.columns]]
+	df, df_new = _union_categories(df.copy(deep=False), df_new)
+
+	key_old = pd.MultiIndex.from_arrays([sample_id(df), df['determinand.notation']])
+	key_new = pd.MultiIndex.from_arrays([sample_id(df_new), df_new['determinand.notation']])
+	new_ = ~key_new.duplicated(keep="last")
+	df_new, key_new = df_new[new_], key_new[new_]
+
+	df_all = pd.concat([df[~key_old.isin(key_new)], df_new], ignore_index=True)
+	df_added = df_all.iloc[len(df_all) - len(df_new):]
+	return(df_all, df_added)
+
+
+def affected_sampling_points(df_added):
+	"""
+	Return the notation and label of the sampling points touched by an update.
+	"""
+	return df_added[['sample.samplingPoint.notation', 'sample.samplingPoint.label']].drop_duplicates().reset_index(drop=True)
+
+
+def daily_DAIN(df, determinands=DAIN_DETERMINANDS):
+	"""
+	Return the DAIN of every sampling point and day (sum and number of the results of the determinands), the aggregate
+	from which the DAIN series of any location and season are derived, see DAIN_series.
+
+	input:
+	df (DataFrame object)
+	determinands (list of int): the determinands summed, default those of DAIN_time
+
+	output:
+	dain (DataFrame object): columns "sum" and "size", indexed by sampling point notation and "Date"
+	"""
+	df_NA = df.iloc[wqfd.determinand_rows(df, determinands)]
+	keys = [df_NA['sample.samplingPoint.notation'].astype(str), wqfn._sample_day(df_NA)]
+	return df_NA["result"].groupby(keys, sort=True).agg(["sum", "size"])
+
+
+def update_daily_DAIN(dain, df_all, df_added, determinands=DAIN_DETERMINANDS):
+	"""
+	Update the aggregate of daily_DAIN after append_samples, recomputing only the (sampling point, day) groups touched
+	by the added rows; all the other groups are kept as they are.
+
+	input:
+	dain (DataFrame object): from daily_DAIN(df)
+	df_all, df_added (DataFrame object): from append_samples
+
+	output:
+	dain (DataFrame object)
+	"""
+	affected = pd.MultiIndex.from_arrays([df_added['sample.samplingPoint.notation'].astype(str), wqfn._sample_day(df_added)]).unique()
+	sites = df_all['sample.samplingPoint.notation'].isin(affected.get_level_values(0).unique())
+	df_sites = df_all[sites.to_numpy()]
+	rows = pd.MultiIndex.from_arrays([df_sites['sample.samplingPoint.notation'].astype(str), wqfn._sample_day(df_sites)]).isin(affected)
+	dain_affected = daily_DAIN(df_sites[rows], determinands)
+
+	dain = pd.concat([dain[~dain.index.isin(affected)], dain_affected])
+	return dain.sort_index()
+
+
+def DAIN_series(dain, notations=None, season_months=None, season=None):
+	"""
+	Return the DAIN series of a set of sampling points from the daily aggregate, as DAIN_time (or DAIN_time_seasons) would compute it from the rows.
+
+	input:
+	dain (DataFrame object): from daily_DAIN or update_daily_DAIN
+	notations (list of str, optional): the sampling point notations of the location, e.g. from loc_subset(...)['sample.samplingPoint.notation'].unique(); None for all
+	season_months (dict, optional): see WaterQualityFunction_nutrient.season_split, default SEASON_MONTHS
+	season (str, optional): None (whole year) or the name of a season, e.g. "summer"
+
+	output:
+	dain_ (Series object), date_ (Series object)
+	"""
+	if notations is not None:
+		dain = dain[dain.index.get_level_values(0).isin([str(notation) for notation in np.atleast_1d(notations)])]
+	if season is not None:
+		months = (wqfn.SEASON_MONTHS if season_months is None else season_months)[season]
+		dain = dain[np.isin(dain.index.get_level_values("Date").month, months)]
+	dain = dain.groupby(level="Date", sort=True)["sum"].sum().rename("result").reset_index()
+	return(dain["result"], dain["Date"])
+
+
+def append_govdat(df, path_new, cache_file=None, dain=None):
+	"""
+	Append a new export to the main dataset and update the derived artefacts incrementally: the query cache keeps the
+	results of the sites not touched by the export, the daily DAIN aggregate only recomputes the touched days,
+	and the columnar cache is rewritten without re-parsing the original csv.
+
+	input:
+	df (DataFrame object): the main dataset, e.g. from WaterQualityFunction_load.load_govdat
+	path_new (str): path of the csv of the new export
+	cache_file (str, optional): the Feather or Parquet cache of load_govdat to rewrite, e.g. "govdat.feather"
+	dain (DataFrame object, optional): the daily DAIN aggregate to update, see daily_DAIN
+
+	output:
+	df_all (DataFrame object), df_added (DataFrame object), dain (DataFrame object or None)
+
+	.. warning::
+	Rewriting the cache requires pyarrow. The original csv is not modified: once the cache is rewritten,
+	load_govdat(..., refresh=False) returns the updated dataset as long as the csv is not newer than the cache.
+	"""
+	df_all, df_added = append_samples(df, wql.read_govdat_csv(path_new))
+	wqfn.carry_over_cache(df, df_all, affected_sampling_points(df_added))
+	if dain is not None:
+		dain = update_daily_DAIN(dain, df_all, df_added)
+	if cache_file is not None:
+		if wql.CACHE_FORMATS.get(cache_file[cache_file.rfind("."):]) == "parquet":
+			df_all.to_parquet(cache_file, index=False)
+		else:
+			df_all.to_feather(cache_file, compression="uncompressed")
+	return(df_all, df_added, dain)
@@ -0,0 +1,140 @@
+"""
+Benchmark of the data-exploration functions on synthetic datasets.
+
+Times and memory-profiles (peak traced allocations) loc_subset, nutrient_time, nutrient_time_seasons, DAIN_time
+and the legacy WaterQualityFunction.DAIN at several dataset sizes, and saves the results as JSON,
+so that runs can be compared across commits:
+
+	python benchmark.py --rows 10000 1000000 50000000 --output bench_<commit>.json
+	python benchmark.py --compare bench_old.json bench_new.json
+"""
+import argparse
+import json
+import platform
+import subprocess
+import time
+import tracemalloc
+
+import pandas as pd
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import numpy as np
+
+import WaterQualityFunction as wqf
+import WaterQualityFunction_nutrient as wqfn
+import WaterQualityFunction_synthetic as wqfs
+
+
+def cached(function):
+	"""
+	Return a call of function with a query cache of its own enabled: measure times the cache hits after the first call.
+	"""
+	cache = wqfn.QueryCache()
+
+	def call():
+		previous, wqfn._query_cache = wqfn._query_cache, cache
+		try:
+			return function()
+		finally:
+			wqfn._query_cache = previous
+	return call
+
+
+def benchmarks(df):
+	"""
+	Return the benchmarked calls, name -> function of no arguments; the "_cached" calls are served from the query cache
+	(WaterQualityFunction_nutrient.enable_cache) and must be faster than the calls they cache.
+	The location is the first synthetic site, as a notation; "LANGSTONE" is a label matching one site every eight.
+	"""
+	site = str(df['sample.samplingPoint.notation'].cat.categories[0])
+	return {
+		"loc_subset": lambda: wqfn.loc_subset(df, site, "notation"),
+		"loc_subset_label": lambda: wqfn.loc_subset(df, "langstone", "label"),
+		"nutrient_time": lambda: wqfn.nutrient_time(df, site, 111, "notation"),
+		"nutrient_time_multi": lambda: wqfn.nutrient_time(df, site, [111, 116, 9943], "notation"),
+		"nutrient_time_seasons": lambda: wqfn.nutrient_time_seasons(df, site, 111, "notation"),
+		"DAIN_time": lambda: wqfn.DAIN_time(df, site, "notation"),
+		"nutrient_time_label": lambda: wqfn.nutrient_time(df, "langstone", 111, "label"),
+		"nutrient_time_label_cached": cached(lambda: wqfn.nutrient_time(df, "langstone", 111, "label")),
+		"nutrient_time_seasons_cached": cached(lambda: wqfn.nutrient_time_seasons(df, site, 111, "notation")),
+		"DAIN_time_label": lambda: wqfn.DAIN_time(df, "langstone", "label"),
+		"DAIN_time_label_cached": cached(lambda: wqfn.DAIN_time(df, "langstone", "label")),
+		"DAIN_legacy": lambda: wqf.DAIN(df, site, ax=plt.figure().gca(), location_type="notation"),
+	}
+
+
+def measure(function, repeat=3):
+	"""
+	Return the best wall time of repeat calls and the peak memory traced during one call.
+	"""
+	times = []
+	for _ in range(repeat):
+		start = time.perf_counter()
+		function()
+		times.append(time.perf_counter() - start)
+		plt.close("all")
+
+	tracemalloc.start()
+	function()
+	peak = tracemalloc.get_traced_memory()[1]
+	tracemalloc.stop()
+	plt.close("all")
+	return {"seconds": min(times), "peak_bytes": peak}
+
+
+def git_commit():
+	try:
+		return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+
+def run(rows, repeat=3, only=None):
+	results = []
+	for n_rows in rows:
+		df = wqfs.synthetic_rows(n_rows)
+		for name, function in benchmarks(df).items():
+			if only and name not in only:
+				continue
+			result = measure(function, repeat if n_rows <= 10**6 else 1)
+			result.update({"function": name, "rows": len(df)})
+			results.append(result)
+			print("%-30s %10d rows %10.6f s %10.1f MB" % (name, len(df), result["seconds"], result["peak_bytes"] / 2**20))
+		del df
+	return {
+		"commit": git_commit(),
+		"date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+		"python": platform.python_version(),
+		"pandas": pd.__version__,
+		"numpy": np.__version__,
+		"results": results,
+	}
+
+
+def compare(old_file, new_file):
+	with open(old_file) as old, open(new_file) as new:
+		old, new = json.load(old), json.load(new)
+	old_results = {(result["function"], result["rows"]): result for result in old["results"]}
+	print("%-30s %10s %12s %12s %8s" % ("function", "rows", old["commit"], new["commit"], "ratio"))
+	for result in new["results"]:
+		key = (result["function"], result["rows"])
+		if key in old_results:
+			print("%-30s %10d %12.6f %12.6f %8.2f" % (key + (old_results[key]["seconds"], result["seconds"], result["seconds"] / old_results[key]["seconds"])))
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--rows", type=int, nargs="+", default=[10**4, 10**6, 5 * 10**7], help="dataset sizes")
+	parser.add_argument("--repeat", type=int, default=3, help="repetitions of each timing (datasets above 1M rows are timed once)")
+	parser.add_argument("--only", nargs="+", help="only run these benchmarks")
+	parser.add_argument("--output", default="bench_output.json", help="JSON file of the results")
+	parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two JSON result files and exit")
+	args = parser.parse_args()
+
+	if args.compare:
+		compare(*args.compare)
+	else:
+		report = run(args.rows, args.repeat, args.only)
+		with open(args.output, "w") as output:
+			json.dump(report, output, indent=1)
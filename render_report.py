@@ -0,0 +1,78 @@
+"""
+Render the report figures without Jupyter.
+
+Loads the dataset once (from the columnar cache of WaterQualityFunction_load.load_govdat), computes the series of all
+the panels in parallel and saves the figures with the Agg backend. Figures whose declaration, style and data are
+unchanged since the last run are skipped (hashes kept in a manifest next to the figures):
+
+	python render_report.py ReportPlots/report.json --data govdat.csv --style mplt_style_n.style1 --mathtext
+
+ReportPlots/report.json declares the figures of the report notebooks: report_freshwater.png, langstone_sw.png and
+langstone_bkg.png (seasonal series of the freshwater, sewage works and background sites) and figure5.png to figure8.png
+(baseline and present-day mean and median of the estuary sites). The site map ReportPlots/langstone.png is not rendered:
+it is a GIS screenshot with no data in the export, and stays a static image.
+
+Only the columns the series are extracted from are loaded (WaterQualityFunction_query.SERIES_COLUMNS); --memory prints
+the memory report of the loaded working set and --max-memory stops before rendering if it exceeds a budget:
+
+	python render_report.py ReportPlots/report.json --memory --max-memory 2000
+
+The figures are declared in a JSON list, as WaterQualityFunction_report.run_report takes them, e.g.
+
+	[{"filename": "ReportPlots/figure5.png", "nrows": 3, "sharex": true, "figsize": [6, 12],
+	  "panels": [{"axis": 0, "kind": "nutrient", "sites": ["G0003616", "G0003625"], "determinands": [9993, 111, 119],
+	              "plot_title": "Fresh water", "ylabel": "Ammonia (N), mg/l"}]}]
+"""
+import argparse
+import importlib
+import json
+import os
+
+import matplotlib
+matplotlib.use("Agg")
+
+import WaterQualityFunction_load as wql
+import WaterQualityFunction_query as wqfq
+import WaterQualityFunction_report as wqfr
+
+
+def load_style(name):
+	"""
+	Return a style dict given as "module.attribute", e.g. "mplt_style_n.style1".
+	"""
+	if name is None:
+		return None
+	module, attribute = name.rsplit(".", 1)
+	return getattr(importlib.import_module(module), attribute)
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("figures", help="JSON file of the declared figures")
+	parser.add_argument("--data", default="govdat.csv", help="csv of the Environment Agency export (its cache is used if present)")
+	parser.add_argument("--cache-format", default="feather", choices=["feather", "parquet"], help="format of the columnar cache")
+	parser.add_argument("--style", help="matplotlib style as module.attribute, e.g. mplt_style_n.style1")
+	parser.add_argument("--mathtext", action="store_true", help="render labels with mathtext instead of LaTeX (text.usetex)")
+	parser.add_argument("--processes", type=int, help="worker processes computing the series")
+	parser.add_argument("--manifest", help="JSON file of the hashes of the rendered figures, default next to the figures file")
+	parser.add_argument("--force", action="store_true", help="render all the figures")
+	parser.add_argument("--all-columns", action="store_true", help="load every column of the export, not only those of the series")
+	parser.add_argument("--memory", action="store_true", help="print the memory report of the loaded dataset")
+	parser.add_argument("--max-memory", type=float, help="budget of the loaded dataset, in MB: stop before rendering beyond it")
+	args = parser.parse_args()
+
+	with open(args.figures) as figures_file:
+		figures = json.load(figures_file)
+	manifest = args.manifest or os.path.splitext(args.figures)[0] + ".manifest.json"
+
+	df = wql.load_govdat(args.data, cache_format=args.cache_format, usecols=None if args.all_columns else wqfq.SERIES_COLUMNS)
+	report = wqfq.memory_report({"df": df})
+	if args.memory:
+		print(report.to_string(index=False))
+		print("working set %.1f MB" % (report["bytes"].sum() / 2**20))
+	if args.max_memory is not None and report["bytes"].sum() > args.max_memory * 2**20:
+		parser.error("the dataset takes %.1f MB, beyond --max-memory %.1f MB" % (report["bytes"].sum() / 2**20, args.max_memory))
+	rendered = wqfr.run_report(df, figures, processes=args.processes, style=load_style(args.style), manifest=manifest, force=args.force, mathtext=args.mathtext)
+	for filename in rendered:
+		print("rendered", filename)
+	print("%d rendered, %d unchanged" % (len(rendered), len(figures) - len(rendered)))
@@ -0,0 +1,79 @@
+"""
+Tests that every extraction function accepts every determinand family of WaterQualityFunction_determinand.FAMILIES,
+and each of its codes alone (as a code and as a one-element list), on a synthetic dataset measuring all the registered
+determinands. Each call must run and return the same series as the explicit list of codes:
+
+	python -m pytest -q test_families.py
+"""
+import pytest
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import numpy as np
+
+import WaterQualityFunction_nutrient as wqfn
+import WaterQualityFunction_plot as wqfplot
+import WaterQualityFunction_stats as wqfst
+import WaterQualityFunction_determinand as wqfd
+import WaterQualityFunction_synthetic as wqfs
+from WaterQualityFunction_index import SamplingPointIndex, sort_by_time
+from WaterQualityFunction_parallel import ParallelBackend
+
+
+def extractors(df, location, processes):
+	"""
+	Return the extraction functions, name -> function of the determinands returning a tuple of arrays.
+	"""
+	backend = ParallelBackend(df, processes)
+	return {
+		"nutrient_time": lambda determinands: wqfn.nutrient_time(df, location, determinands, "notation"),
+		"nutrient_time_sorted": lambda determinands: wqfn.nutrient_time(sort_by_time(df), location, determinands, "notation"),
+		"nutrient_time_index": lambda determinands: wqfn.nutrient_time(SamplingPointIndex(df), location, determinands, "notation"),
+		"nutrient_time_seasons": lambda determinands: wqfn.nutrient_time_seasons(df, location, determinands, "notation"),
+		"batch_time": lambda determinands: tuple(wqfn.batch_time(df, [location], determinands, seasons=True)[["Date", "result"]].T.to_numpy()),
+		"long_series": lambda determinands: tuple(wqfst.long_series(df, [location], determinands)[["Date", "result"]].T.to_numpy()),
+		"DAIN_pairs": lambda determinands: wqfn.DAIN_pairs(wqfn.loc_subset(df, location, "notation"), determinands, paired=False),
+		"parallel_nutrient_time": lambda determinands: backend.nutrient_time(location, determinands, "notation"),
+		"parallel_nutrient_time_seasons": lambda determinands: backend.nutrient_time_seasons(location, determinands, "notation"),
+		"plot_summer": lambda determinands: _plotted(wqfplot.plot_location_nutrientVStime_customizable_summer, df, location, determinands),
+		"plot_winter": lambda determinands: _plotted(wqfplot.plot_location_nutrientVStime_customizable_winter, df, location, determinands),
+	}, backend
+
+
+def _plotted(function, df, location, determinands):
+	ax = function(df, location, determinands, ax=plt.figure().gca(), location_type="notation")
+	offsets = ax.collections[0].get_offsets()
+	plt.close("all")
+	return(np.asarray(offsets[:, 0]), np.asarray(offsets[:, 1]))
+
+
+def _same(a, b):
+	return len(a) == len(b) and all(np.array_equal(np.asarray(x, dtype=object), np.asarray(y, dtype=object)) for x, y in zip(a, b))
+
+
+N_SITES = 4
+PROCESSES = 1
+NAMES = ["nutrient_time", "nutrient_time_sorted", "nutrient_time_index", "nutrient_time_seasons", "batch_time", "long_series", "DAIN_pairs",
+	"parallel_nutrient_time", "parallel_nutrient_time_seasons", "plot_summer", "plot_winter"]
+
+
+@pytest.fixture(scope="module")
+def functions():
+	df = wqfs.synthetic_govdat(N_SITES, determinands=tuple(wqfd.DETERMINANDS), years=(2000, 2002))
+	location = str(df['sample.samplingPoint.notation'].cat.categories[0])
+	functions, backend = extractors(df, location, PROCESSES)
+	with backend:
+		yield functions
+
+
+@pytest.mark.parametrize("name", NAMES)
+@pytest.mark.parametrize("family", list(wqfd.FAMILIES))
+def test_family(functions, name, family):
+	function = functions[name]
+	codes = wqfd.FAMILIES[family]
+	for determinands, explicit in [(family, list(codes))] + [(code, [code]) for code in codes[:1]]:
+		assert _same(function(determinands), function(explicit)), "%s(%r) differs from %s" % (name, determinands, explicit)
+
+
+def test_every_extractor_is_checked(functions):
+	assert sorted(functions) == sorted(NAMES)
@@ -0,0 +1,79 @@
+"""
+Tests of WaterQualityFunction_nutrient against the loops of the original WaterQualityFunction module, on synthetic datasets:
+
+	python -m pytest -q test_nutrient.py
+"""
+import pandas as pd
+import numpy as np
+
+import WaterQualityFunction_nutrient as wqfn
+import WaterQualityFunction_synthetic as wqfs
+
+
+def legacy_DAIN(df_env):
+	"""
+	The per-date loop of the original WaterQualityFunction.DAIN: first result of 111 plus first result of 116, on the dates with both.
+	"""
+	date_ = []
+	dain_ = []
+	for date in np.unique(df_env["Date"].iloc[0::]):
+		if (len(df_env[(df_env["Date"]==date)&(df_env['determinand.notation']==111)]) > 0) & (len(df_env[(df_env["Date"]==date)&(df_env['determinand.notation']==116)]) > 0):
+			dain_.append(df_env[(df_env["Date"]==date)&(df_env['determinand.notation']==111)]["result"].values[0]+df_env[(df_env["Date"]==date)&(df_env['determinand.notation']==116)]["result"].values[0])
+			date_.append(date)
+	return(date_, dain_)
+
+
+def _site_with_nan(seed=0, fraction=0.2):
+	df = wqfs.synthetic_govdat(2, determinands=(111, 116, 9943), years=(2000, 2003), seed=seed)
+	location = str(df['sample.samplingPoint.notation'].cat.categories[0])
+	df_env = wqfn.loc_subset(df, location, "notation").copy()
+	missing = np.random.default_rng(seed).random(len(df_env)) < fraction
+	df_env.loc[missing, "result"] = np.nan
+	return df_env
+
+
+def test_DAIN_pairs_paired_keeps_nan_as_legacy_loop():
+	df_env = _site_with_nan()
+	assert df_env["result"].isna().any()
+
+	date_, dain_ = wqfn.DAIN_pairs(df_env, (111, 116), paired=True)
+	legacy_date, legacy_dain = legacy_DAIN(df_env)
+
+	np.testing.assert_array_equal(np.asarray(date_), np.asarray(legacy_date))
+	np.testing.assert_allclose(np.asarray(dain_, dtype=float), np.asarray(legacy_dain, dtype=float), equal_nan=True)
+	assert np.isnan(np.asarray(dain_, dtype=float)).any()
+
+
+def test_DAIN_pairs_paired_nan_pair():
+	date = pd.Timestamp("2001-06-01")
+	df_env = pd.DataFrame({
+		"Date": [date, date, date + pd.Timedelta(days=1), date + pd.Timedelta(days=1)],
+		'determinand.notation': [111, 116, 111, 116],
+		"result": [np.nan, 2.0, 1.0, 2.0],
+	})
+
+	date_, dain_ = wqfn.DAIN_pairs(df_env, (111, 116), paired=True)
+	assert list(date_) == [date, date + pd.Timedelta(days=1)]
+	assert np.isnan(dain_.iloc[0]) and dain_.iloc[1] == 3.0
+
+	date_, dain_ = wqfn.DAIN_pairs(df_env, (111, 116), paired=False)
+	assert list(dain_) == [2.0, 3.0]
+
+
+def test_batch_time_no_notations():
+	df = wqfs.synthetic_govdat(2, determinands=(111, 116), years=(2000, 2001))
+
+	df_long = wqfn.batch_time(df, [], [111, 116], seasons=True)
+	assert df_long.empty and list(df_long.columns) == ["site", "determinand", "season", "Date", "result"]
+	assert wqfn.batch_time(df, [], [111, 116], as_dict=True) == {}
+
+
+def test_DAIN_time_paired_as_legacy_loop():
+	df = wqfs.synthetic_govdat(2, determinands=(111, 116, 9943), years=(2000, 2003))
+	location = str(df['sample.samplingPoint.notation'].cat.categories[0])
+
+	dain_, date_ = wqfn.DAIN_time(df, location, "notation", paired=True)
+	legacy_date, legacy_dain = legacy_DAIN(wqfn.loc_subset(df, location, "notation"))
+
+	np.testing.assert_array_equal(np.asarray(date_), np.asarray(legacy_date))
+	np.testing.assert_allclose(np.asarray(dain_, dtype=float), np.asarray(legacy_dain, dtype=float), equal_nan=True)